@@ -1,10 +1,41 @@
 import re
+import os
 from pathlib import Path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 import argparse
 
+from tmdl_io import atomic_write, read_text
+
+try:
+    # Optional: google-re2 guarantees linear-time matching on large M bodies
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+# "{{" / "}}" (backreference → stdlib re; RE2 doesn't support them)
+_DOUBLE_BRACE_RE = re.compile(r"([{}])\1")
+
+# What stdlib re's \s matches in str patterns (every str.isspace() character), spelled out:
+# re2's \s is ASCII-only, so the optional engine must not change which lines match
+_WS = "[ \t\n\r\f\v\x1c-\x1f\x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]"
+
+# source = / let / <body> / in / <return>, compiled once for every file
+# (inline (?m) so the same pattern compiles under both re and re2)
+_PARTITION_PATTERN = (
+    r"(?m)(?:^|\n)([ \t]*)source" + _WS + "*=" + _WS + r"*\n"   # capture table-level indent if needed
+    r"([ \t]*)let" + _WS + r"*\n"
+    r"(?P<body>[\s\S]*?)"
+    r"\n[ \t]*in" + _WS + r"*\n"
+    r"[ \t]*(?P<ret>[^\n]+)"
+)
+_PARTITION_RE = _re_engine.compile(_PARTITION_PATTERN)
+
+PARALLEL_MIN_FILES = 4  # below this, starting worker processes costs more than the work
+
 def fix_braces(text: str) -> str:
-    # Replace accidental double braces inside M
-    return text.replace("{{", "{").replace("}}", "}")
+    # Replace accidental double braces inside M ("{{" → "{", "}}" → "}") in one pass
+    return _DOUBLE_BRACE_RE.sub(r"\1", text)
 
 def fix_m_partition_block(text: str, base_indent=2, let_indent=4, body_indent=6, ret_indent=6) -> str:
     """
@@ -22,24 +53,10 @@ def fix_m_partition_block(text: str, base_indent=2, let_indent=4, body_indent=6,
     bi  = " " * (base_indent + body_indent)  # body lines
     ri  = " " * (base_indent + ret_indent)   # return line
 
-    pattern = re.compile(
-        r"(?:^|\n)([ \t]*)source\s*=\s*\n"   # capture table-level indent if needed
-        r"([ \t]*)let\s*\n"
-        r"(?P<body>[\s\S]*?)"
-        r"\n[ \t]*in\s*\n"
-        r"[ \t]*(?P<ret>[^\n]+)",
-        re.MULTILINE
-    )
-
     def _repl(m: re.Match) -> str:
         raw_body = m.group("body").strip("\n")
-        body_lines = []
-        for line in raw_body.splitlines():
-            s = line.strip()
-            if not s:
-                continue
-            body_lines.append(f"{bi}{s}")
-        fixed_body = "\n".join(body_lines)
+        # strip/filter via C-level map/filter instead of a per-line Python loop
+        fixed_body = "\n".join(bi + s for s in filter(None, map(str.strip, raw_body.splitlines())))
         return (
             f"\n{si}source =\n"
             f"{li}let\n"
@@ -48,13 +65,16 @@ def fix_m_partition_block(text: str, base_indent=2, let_indent=4, body_indent=6,
             f"{ri}{m.group('ret').strip()}"
         )
 
-    return pattern.sub(_repl, fix_braces(text))
+    return _PARTITION_RE.sub(_repl, fix_braces(text))
 
 def process_file(p: Path, **kw):
-    txt = p.read_text(encoding="utf-8")
+    """Return (path, fixed text) or (path, None) when the file is already canonical."""
+    txt = read_text(p)
     fixed = fix_m_partition_block(txt, **kw)
-    p.write_text(fixed, encoding="utf-8")
-    print(f"[OK] {p}")
+    if fixed == txt:
+        # Already canonical: skip the write (idempotent re-runs touch nothing)
+        return p, None
+    return p, fixed
 
 def main():
     ap = argparse.ArgumentParser()
@@ -69,14 +89,26 @@ def main():
     if not td.exists():
         raise SystemExit(f"Tables dir not found: {td}")
 
-    for f in sorted(td.glob("*.tmdl")):
-        process_file(
-            f,
-            base_indent=args.base_indent,
-            let_indent=args.let_indent,
-            body_indent=args.body_indent,
-            ret_indent=args.ret_indent,
-        )
+    files = sorted(td.glob("*.tmdl"))
+    worker = partial(
+        process_file,
+        base_indent=args.base_indent,
+        let_indent=args.let_indent,
+        body_indent=args.body_indent,
+        ret_indent=args.ret_indent,
+    )
+    if len(files) < PARALLEL_MIN_FILES:
+        staged = dict(map(worker, files))
+    else:
+        # Each file is an independent rewrite → fan out across cores
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            staged = dict(ex.map(worker, files, chunksize=8))
+
+    # Flush all changed files in one batch once the scan is complete
+    for p, fixed in staged.items():
+        if fixed is not None:
+            atomic_write(p, fixed.encode("utf-8"))
+            print(f"[OK] {p}")
 
 if __name__ == "__main__":
     main()
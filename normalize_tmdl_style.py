@@ -4,86 +4,143 @@
 # - Removes curly-brace block style and converts known openers to "label:" lines
 # - Keeps semantics intact (NO JSON). Purely formatting.
 
-import argparse, re
+import argparse, mmap, os, re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from tmdl_io import atomic_write
+
 BLOCK_OPENERS = [
     r"columns", r"measures", r"hierarchies", r"partitions", r"annotations",
     r"calculationGroups?", r"dataAccessOptions", r"legacyRedirects",
     r"formatStringDefinition", r"displayFolders", r"roles", r"tables"
 ]
 
-# Regexes
-RE_OPEN_BRACE_LINE = re.compile(r"^\s*\{\s*$")
-RE_CLOSE_BRACE_LINE = re.compile(r"^\s*\}\s*$")
-RE_TABLE_HEADER = re.compile(r"^(?P<indent>\s*)(table\s+[^\{\n]+)\s*\{\s*$")
-RE_MODEL_HEADER = re.compile(r"^(?P<indent>\s*)(model\s+[^\{\n]*)\s*\{\s*$")
-RE_REL_HEADER   = re.compile(r"^(?P<indent>\s*)(relationship\s+[^\{\n]+)\s*\{\s*$")
-RE_BLOCK_LABELS = re.compile(rf"^(?P<indent>\s*)\b(?P<label>{'|'.join(BLOCK_OPENERS)})\b\s*\{{\s*$")
-RE_EMPTY_LINES  = re.compile(r"\n{3,}")
+# Regexes (bytes, MULTILINE, applied to the whole file; [^\S\n] = whitespace within a line).
+# TMDL keywords are ASCII, so we never need to decode the file to rewrite it.
+_WS = r"[^\S\n]"
+# "table X {" / "model X {" / "relationship X {" in one pass
+RE_ANY_HEADER   = re.compile(
+    rf"^(?P<indent>{_WS}*)(?P<head>model{_WS}+[^\{{\n]*|(?:table|relationship){_WS}+[^\{{\n]+){_WS}*\{{{_WS}*$".encode(),
+    re.MULTILINE,
+)
+RE_BLOCK_LABELS = re.compile(
+    rf"^(?P<indent>{_WS}*)\b(?P<label>{'|'.join(BLOCK_OPENERS)})\b{_WS}*\{{{_WS}*$".encode(),
+    re.MULTILINE,
+)
+# Pure "{" / "}" lines, including their line break
+RE_BRACE_ONLY   = re.compile(rf"^{_WS}*[{{}}]{_WS}*(?:\n|\Z)".encode(), re.MULTILINE)
+RE_EMPTY_LINES  = re.compile(rb"\n{3,}")
 
-def transform_text(t: str) -> str:
-    out_lines = []
-    for line in t.splitlines():
-        # Convert headers "table X {" → "table X"
-        m = RE_TABLE_HEADER.match(line)
-        if m:
-            out_lines.append(f"{m.group('indent')}{m.group(2)}")
-            continue
-        m = RE_MODEL_HEADER.match(line)
-        if m:
-            out_lines.append(f"{m.group('indent')}{m.group(2)}")
-            continue
-        m = RE_REL_HEADER.match(line)
-        if m:
-            out_lines.append(f"{m.group('indent')}{m.group(2)}")
-            continue
+PARALLEL_MIN_FILES = 4  # below this, starting worker processes costs more than the work
 
+def transform_text(t: bytes) -> bytes:
+    # Output always uses "\n" line endings
+    if b"\r" in t:
+        t = t.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    # Fast path: every rule below needs a brace somewhere in the text
+    if b"{" in t or b"}" in t:
+        # Convert headers "table X {" → "table X" (also model / relationship)
+        t = RE_ANY_HEADER.sub(rb"\g<indent>\g<head>", t)
         # Convert known block openers "columns {" → "columns:"
-        m = RE_BLOCK_LABELS.match(line)
-        if m:
-            out_lines.append(f"{m.group('indent')}{m.group('label')}:")
-            continue
-
+        t = RE_BLOCK_LABELS.sub(rb"\g<indent>\g<label>:", t)
         # Drop pure "{" / "}" lines
-        if RE_OPEN_BRACE_LINE.match(line) or RE_CLOSE_BRACE_LINE.match(line):
-            continue
-
-        out_lines.append(line)
-
-    text = "\n".join(out_lines)
+        t = RE_BRACE_ONLY.sub(b"", t)
     # Collapse excessive blank lines
-    text = RE_EMPTY_LINES.sub("\n\n", text)
-    return text.strip() + "\n"
+    text = RE_EMPTY_LINES.sub(b"\n\n", t)
+    return text.strip() + b"\n"
+
+def _is_normalized(buf) -> bool:
+    """
+    True when transform_text(buf) would return buf unchanged.
+    Works on any buffer (bytes or mmap) without copying it.
+    """
+    if buf[-1:] != b"\n":
+        return False
+    if len(buf) > 1 and (buf[:1].isspace() or buf[-2:-1].isspace()):
+        return False
+    if buf.find(b"\r") != -1 or RE_EMPTY_LINES.search(buf):
+        return False
+    if buf.find(b"{") == -1 and buf.find(b"}") == -1:
+        return True
+    return not (RE_ANY_HEADER.search(buf) or RE_BLOCK_LABELS.search(buf) or RE_BRACE_ONLY.search(buf))
 
 def is_json_like(path: Path) -> bool:
+    # Only the first non-whitespace byte matters; don't read the whole file
     try:
-        s = path.read_text(encoding="utf-8").lstrip()
-        return s.startswith("{") or s.startswith("[")
-    except Exception:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
         return False
+    try:
+        head = os.read(fd, 512)
+        if head.startswith(b"\xef\xbb\xbf"):  # UTF-8 BOM
+            head = head[3:]
+        while True:
+            head = head.lstrip()
+            if head:
+                return head[:1] in (b"{", b"[")
+            head = os.read(fd, 512)
+            if not head:
+                return False
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
 
 def process_file(p: Path):
+    """Return (path, new bytes) or (path, None) when nothing needs rewriting."""
     if p.suffix.lower() != ".tmdl":
-        return
+        return p, None
     if is_json_like(p):
         # Don't try to “prettify” actual JSON; upstream guard should avoid this case anyway.
-        return
-    original = p.read_text(encoding="utf-8")
+        return p, None
+    fd = os.open(p, os.O_RDONLY)
+    try:
+        if os.fstat(fd).st_size == 0:
+            original = b""   # mmap can't map empty files
+        else:
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                # Scan the mapping in place; only copy it out when we must rewrite
+                if _is_normalized(mm):
+                    return p, None
+                original = mm[:]
+    finally:
+        os.close(fd)
     transformed = transform_text(original)
-    if transformed != original:
-        p.write_text(transformed, encoding="utf-8")
+    if transformed == original:
+        return p, None
+    return p, transformed
+
+def _iter_tmdl(root: Path):
+    """Yield *.tmdl files in definition/ and definition/tables/ (one scandir per dir)."""
+    for d in (root, root / "tables"):
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name.endswith(".tmdl") and e.is_file():
+                        yield Path(e.path)
+        except FileNotFoundError:
+            continue
 
 def main():
     ap = argparse.ArgumentParser("Normalize TMDL style (remove curly-brace blocks)")
     ap.add_argument("--root", required=True, help="Path to SemanticModel/definition directory")
     args = ap.parse_args()
 
-    root = Path(args.root).expanduser().resolve()
+    root = Path(os.path.realpath(os.path.expanduser(args.root)))
     if not root.exists():
         raise SystemExit(f"Not found: {root}")
-    for f in list(root.glob("*.tmdl")) + list((root / "tables").glob("*.tmdl")):
-        process_file(f)
+    files = list(_iter_tmdl(root))
+    if len(files) < PARALLEL_MIN_FILES:
+        staged = dict(map(process_file, files))
+    else:
+        # Files are independent → process them in parallel
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            staged = dict(ex.map(process_file, files, chunksize=8))
+    # Flush all rewrites in one batch after the scan
+    for p, data in staged.items():
+        if data is not None:
+            atomic_write(p, data)
     print("TMDL files normalized (cosmetic formatting only).")
 
 if __name__ == "__main__":
@@ -23,9 +23,30 @@ import csv
 import os
 import re
 import shutil
+import stat
 from pathlib import Path
 from typing import List, Optional, Tuple, Dict
 
+from tmdl_io import read_text, write_text
+
+# Compiled once at import; reused for every column / file
+_COL_SUFFIX_RE = re.compile(r"^(.*?)[ ]*\(([^\)]+)\)$")
+_TMDL_COLUMN_RE = re.compile(r"(?m)^\s*column\s+[A-Za-z0-9_]+")
+_TMDL_COLUMN_BLOCK_RE = re.compile(r"(?ms)(^\s*column\s+.*?(?=^\s*(?:column\s+|partition\s+|annotation\s+|$)))")
+_M_IN_LINE_RE = re.compile(r"\n\s*in\s*\n", re.IGNORECASE)
+_M_LET_LINE_RE = re.compile(r"(?m)^\s*let\s*$")
+_NONBLANK_LINE_RE = re.compile(r"(?m)^(?=[^\S\n]*\S)")
+# Line boundaries str.splitlines() knows besides "\n" (the regex fast path only sees "\n")
+_OTHER_LINE_BREAK_RE = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+_DOUBLE_BRACE_RE = re.compile(r"([{}])\1")
+
+# Common dtype aliases → TMDL dataType (anything else → string)
+_DTYPE_MAP: Dict[str, str] = {
+    **{k: "int64" for k in ("integer", "int", "int64", "long")},
+    **{k: "double" for k in ("double", "real", "float", "decimal")},
+    **{k: "dateTime" for k in ("datetime", "date", "timestamp")},
+}
+
 # --------------------------
 # Helpers
 # --------------------------
@@ -38,7 +59,7 @@ def _find_sem_model_dir(pbip_out_dir: Path) -> Path:
     """
     for name in ("smtemplate.SemanticModel", "SemanticModel", "template.SemanticModel"):
         cand = pbip_out_dir / name
-        if cand.exists() and cand.is_dir():
+        if cand.is_dir():  # one stat; False when missing
             return cand
     # nothing found → create canonical path
     cand = pbip_out_dir / "SemanticModel"
@@ -51,7 +72,9 @@ def _strip_table_suffix(col: str, table: str) -> str:
     Example: 'Region(People)' or 'Region (People)' -> 'Region' when table == 'People'.
     """
     col = (col or "").strip().strip("'").strip('"')
-    m = re.match(r"^(.*?)[ ]*\(([^\)]+)\)$", col)
+    if not col.endswith(")") or "(" not in col:
+        return col  # common case: no suffix, skip the regex
+    m = _COL_SUFFIX_RE.match(col)
     if m and m.group(2).strip().lower() == (table or "").strip().lower():
         return m.group(1).strip()
     return col
@@ -71,12 +94,17 @@ def _copy_template_if_missing(template_input: Path, pbip_out_dir: Path) -> None:
 
     If the output dir doesn't exist, copy the whole template directory tree there.
     """
-    template_dir = template_input
-    if template_dir.is_file():
+    # One stat answers exists / is_file / is_dir together
+    try:
+        mode = os.stat(template_input).st_mode
+    except OSError:
+        mode = 0
+    if stat.S_ISREG(mode):
         # If they gave us /path/.../PBIPTemplate.pbip, use its parent folder.
-        template_dir = template_dir.parent
-
-    if not template_dir.exists() or not template_dir.is_dir():
+        template_dir = template_input.parent
+    elif stat.S_ISDIR(mode):
+        template_dir = template_input
+    else:
         raise FileNotFoundError(f"PBIP template directory not found: {template_input}")
 
     if pbip_out_dir.exists():
@@ -86,19 +114,18 @@ def _copy_template_if_missing(template_input: Path, pbip_out_dir: Path) -> None:
     shutil.copytree(template_dir, pbip_out_dir)
 
 
-def _read_text(path: Path) -> str:
-    return path.read_text(encoding="utf-8")
-
-def _write_text(path: Path, text: str) -> None:
-    path.write_text(text, encoding="utf-8")
-
 def _indent_block(text: str, spaces: int) -> str:
     pad = " " * spaces
-    return "\n".join(pad + line if line.strip() else line for line in text.splitlines())
+    if _OTHER_LINE_BREAK_RE.search(text):
+        return "\n".join(pad + line if line.strip() else line for line in text.splitlines())
+    # "\n"-only text: pad every non-blank line in one regex pass; like the splitlines/join
+    # form, the result has no line terminator after its last line
+    out = _NONBLANK_LINE_RE.sub(pad, text)
+    return out[:-1] if out.endswith("\n") else out
 
 def _looks_like_tmdl_columns_block(text: str) -> bool:
     # Heuristic: if it already contains "column <name>" lines, treat as TMDL-ready
-    return bool(re.search(r"(?m)^\s*column\s+[A-Za-z0-9_]+", text))
+    return bool(_TMDL_COLUMN_RE.search(text))
 
 def _parse_simple_columns_rows(text: str) -> List[Tuple[str, str, Optional[str]]]:
     """
@@ -110,31 +137,21 @@ def _parse_simple_columns_rows(text: str) -> List[Tuple[str, str, Optional[str]]
     Returns list of (name, type, summarizeBy or None)
     """
     out: List[Tuple[str, str, Optional[str]]] = []
-    for raw in text.splitlines():
-        line = raw.strip()
-        if not line or line.startswith("#"):
-            continue
-        # split by comma or pipe
-        if "," in line:
-            parts = [p.strip() for p in line.split(",")]
-        elif "|" in line:
-            parts = [p.strip() for p in line.split("|")]
-        else:
-            # fallback: if it's just a name, default string/none
-            parts = [line]
-
-        name = parts[0]
-        dtype = (parts[1] if len(parts) > 1 else "string").lower()
-        agg = parts[2] if len(parts) > 2 else None
+    lines = (ln.strip() for ln in text.splitlines())
+    # split by comma, or by pipe when the line has no comma; a bare name is one field
+    # (QUOTE_NONE: fields are taken verbatim, quotes included)
+    reader = csv.reader(
+        (ln if "," in ln or "|" not in ln else ln.replace("|", ",")
+         for ln in lines if ln and not ln.startswith("#")),
+        quoting=csv.QUOTE_NONE,
+    )
+    for row in reader:
+        # strip only the fields we use; extra trailing fields are ignored
+        n = len(row)
+        name = row[0].strip()
         # normalize a few common dtype aliases
-        if dtype in ("integer", "int", "int64", "long"):
-            dtype = "int64"
-        elif dtype in ("double", "real", "float", "decimal"):
-            dtype = "double"
-        elif dtype in ("datetime", "date", "timestamp"):
-            dtype = "dateTime"
-        else:
-            dtype = "string"
+        dtype = _DTYPE_MAP.get(row[1].strip().lower(), "string") if n > 1 else "string"
+        agg = row[2].strip() if n > 2 else None
         out.append((name, dtype, agg))
     return out
 
@@ -142,38 +159,42 @@ def _render_columns_from_rows(rows: List[Tuple[str, str, Optional[str]]]) -> str
     """
     Render TMDL column blocks from parsed rows.
     """
-    lines: List[str] = []
-    for name, dtype, agg in rows:
-        lines.append(f"  column {name}")
-        lines.append(f"    dataType: {dtype}")
-        if agg and agg.lower() not in ("none", "default"):
-            lines.append(f"    summarizeBy: {agg}")
-        lines.append(f"    sourceColumn: {name}")
-    return "\n".join(lines)
+    def _block(name: str, dtype: str, agg: Optional[str]) -> str:
+        summarize = f"\n    summarizeBy: {agg}" if agg and agg.lower() not in ("none", "default") else ""
+        return f"  column {name}\n    dataType: {dtype}{summarize}\n    sourceColumn: {name}"
+    return "\n".join(_block(*row) for row in rows)
 
 def _load_columns_block(columns_file: Path) -> str:
     """
     Load columns spec; if it's already TMDL 'column ...' blocks, return as-is.
     Otherwise, treat as a simple CSV-like list and render.
     """
-    raw = _read_text(columns_file)
+    raw = read_text(columns_file)
     if _looks_like_tmdl_columns_block(raw):
         # Clean up any top-level 'table' wrapper if the file accidentally contains it
         if raw.lstrip().startswith("table "):
             # Extract only the 'column ...' blocks
-            cols = re.findall(r"(?ms)(^\s*column\s+.*?(?=^\s*(?:column\s+|partition\s+|annotation\s+|$)))", raw)
-            return "\n".join(c.rstrip() for c in cols)
+            return "\n".join(m.group(1).rstrip() for m in _TMDL_COLUMN_BLOCK_RE.finditer(raw))
         return raw.strip()
     # Parse simple rows
     rows = _parse_simple_columns_rows(raw)
     return _render_columns_from_rows(rows)
 
+def _reindent_m_line(s: str) -> str:
+    """Canonical indent for one stripped M line: 'let' / 'in' at 6, body at 8."""
+    sl = s.lower()
+    if sl == "let":
+        return "      let"
+    elif sl == "in":
+        return "      in"
+    return "        " + s
+
 def _wrap_partition_block(table: str, m_text: str) -> str:
     """
     Take a raw M block (let...in...) and wrap as TMDL partition with canonical indentation.
     Also ensure single braces (sometimes LLMs print '{{' / '}}').
     """
-    m_text = m_text.replace("{{", "{").replace("}}", "}")
+    m_text = _DOUBLE_BRACE_RE.sub(r"\1", m_text)
 
     # Trim and indent the M lines under "source ="
     m_text = m_text.strip("\n")
@@ -185,71 +206,86 @@ def _wrap_partition_block(table: str, m_text: str) -> str:
     #         ...
     #       in
     #         Return
-    lines = []
-    lines.append(f"  partition {table} = m")
-    lines.append(f"    mode: import")
-    lines.append(f"    source =")
+    head = f"  partition {table} = m\n    mode: import\n    source ="
     # if user-supplied block includes its own 'let', reindent; otherwise trust it
     # We force 6 spaces for 'let' / 'in' and 8 for body
     # Attempt a lightweight normalization:
     # Put a newline before 'in' to ensure we can indent the return nicely
-    m_text_norm = re.sub(r"\n\s*in\s*\n", "\n      in\n", m_text, flags=re.IGNORECASE)
-    if not re.search(r"(?m)^\s*let\s*$", m_text_norm):
+    m_text_norm = _M_IN_LINE_RE.sub("\n      in\n", m_text)
+    if not _M_LET_LINE_RE.search(m_text_norm):
         # If it doesn't seem to contain a line with exactly 'let', just indent raw
-        lines.append(_indent_block(m_text_norm, 6))
-    else:
-        # Reindent line-by-line:
-        out_m = []
-        for raw in m_text_norm.splitlines():
-            s = raw.strip()
-            if not s:
-                continue
-            if s.lower() == "let":
-                out_m.append("      let")
-            elif s.lower() == "in":
-                out_m.append("      in")
-            else:
-                out_m.append("        " + s)
-        lines.extend(out_m)
-    return "\n".join(lines)
+        return f"{head}\n{_indent_block(m_text_norm, 6)}"
+    # Reindent line-by-line (single pass, no intermediate list)
+    body = "\n".join(
+        _reindent_m_line(s) for s in (raw.strip() for raw in m_text_norm.splitlines()) if s
+    )
+    return f"{head}\n{body}" if body else head
+
+def _create_if_missing(path: Path, text: str) -> None:
+    # O_EXCL: check-and-create in a single open() instead of exists() + write
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    except FileExistsError:
+        return
+    try:
+        if text:
+            os.write(fd, text.encode("utf-8"))
+    finally:
+        os.close(fd)
 
 def _ensure_model_file(model_path: Path) -> None:
-    if not model_path.exists():
-        _write_text(model_path, "model\n")
+    _create_if_missing(model_path, "model\n")
 
 def _ensure_relationships_file(rel_path: Path) -> None:
-    if not rel_path.exists():
-        _write_text(rel_path, "")
+    _create_if_missing(rel_path, "")
 
 def _read_existing_tables(tables_dir: Path) -> List[str]:
-    names = []
-    if tables_dir.exists():
-        for p in tables_dir.glob("*.tmdl"):
-            names.append(p.stem)
-    return names
+    # One scandir pass; dirents carry the file type, so no per-entry stat
+    try:
+        with os.scandir(tables_dir) as it:
+            return [e.name[:-5] for e in it if e.name.endswith(".tmdl") and e.is_file()]
+    except FileNotFoundError:
+        return []
 
 def _append_or_update_relationships(rel_path: Path, rels: List[Tuple[str,str,str,str]], behavior: Optional[str] = None) -> None:
     """
     rels: list of (left_table, left_col, right_table, right_col)
     Emits TMDL blocks; normalizes col suffixes.
     """
-    existing = _read_text(rel_path) if rel_path.exists() else ""
-    blocks: List[str] = []
-    if existing.strip():
-        blocks.append(existing.rstrip() + "\n")
-
+    try:
+        existing = read_text(rel_path)
+    except FileNotFoundError:
+        existing = ""
+
+    # One pre-formatted string per relationship, deduped (within this call) on the normalized
+    # endpoints; dicts keep insertion order, so output order is unchanged. Blocks already in
+    # the file are left alone and the new ones appended after them, as before.
+    xfb = f"\n  crossFilteringBehavior: {behavior}" if behavior else ""
+    new_blocks: Dict[str, str] = {}
     for (lt, lc, rt, rc) in rels:
         lc_n = _strip_table_suffix(lc, lt)
         rc_n = _strip_table_suffix(rc, rt)
-        name = f"{lt}_{lc_n}_{rt}_{rc_n}"
-        blocks.append(f"relationship {name}")
-        blocks.append(f"  fromColumn: {_fmt_table_ident(lt)}.'{lc_n}'")
-        blocks.append(f"  toColumn: {_fmt_table_ident(rt)}.'{rc_n}'")
-        if behavior:
-            blocks.append(f"  crossFilteringBehavior: {behavior}")
-        blocks.append("")  # blank line
+        header = f"relationship {lt}_{lc_n}_{rt}_{rc_n}"
+        if header in new_blocks:
+            continue
+        new_blocks[header] = (
+            f"{header}\n"
+            f"  fromColumn: {_fmt_table_ident(lt)}.'{lc_n}'\n"
+            f"  toColumn: {_fmt_table_ident(rt)}.'{rc_n}'{xfb}"
+        )
 
-    _write_text(rel_path, "\n".join(blocks).rstrip() + "\n")
+    blocks: List[str] = []
+    if existing.strip():
+        blocks.append(existing.rstrip())
+    blocks.extend(new_blocks.values())
+
+    # Stream blocks through one 128 KiB buffer instead of building the joined text
+    with open(rel_path, "wb", buffering=1 << 17) as f:
+        for i, blk in enumerate(blocks):
+            if i:
+                f.write(b"\n\n")
+            f.write(blk.encode("utf-8"))
+        f.write(b"\n")
 
 # --------------------------
 # Core integrate
@@ -278,22 +314,20 @@ def integrate_table(xml_path: Path,
 
     # 2) Build TMDL for the table
     cols_block = _load_columns_block(columns_file)
-    m_raw = _read_text(partition_file)
+    m_raw = read_text(partition_file)
 
     # Compose the table file
-    parts: List[str] = []
-    parts.append(f"table {table_name}")
     # columns (already indented or we indent if needed)
     if not cols_block.startswith("  "):
         cols_block = _indent_block(cols_block, 2)
-    parts.append(cols_block)
-    # partition block (wrapped)
-    parts.append(_wrap_partition_block(table_name, m_raw))
-    # annotation (Power BI likes this)
-    parts.append("  annotation PBI_ResultType = Table")
-
-    tmdl_text = "\n".join(parts).rstrip() + "\n"
-    _write_text(table_tmdl, tmdl_text)
+    # header, columns, partition block (wrapped), annotation (Power BI likes this)
+    tmdl_text = (
+        f"table {table_name}\n"
+        f"{cols_block}\n"
+        f"{_wrap_partition_block(table_name, m_raw)}\n"
+        "  annotation PBI_ResultType = Table\n"
+    )
+    write_text(table_tmdl, tmdl_text)
 
     # 3) Optionally add “obvious” relationships if both sides exist:
     #    - Orders.Region = People.Region
@@ -319,7 +353,7 @@ def integrate_table(xml_path: Path,
 # CLI
 # --------------------------
 
-def main():
+def main(argv: Optional[List[str]] = None):
     ap = argparse.ArgumentParser()
     ap.add_argument("--xml", required=True, help="Source Tableau XML (not strictly required to parse)")
     ap.add_argument("--pbip-template", required=True, help="Path to PBIP template (.pbip folder)")
@@ -327,7 +361,7 @@ def main():
     ap.add_argument("--table", required=True, help="Table name to integrate (e.g., Orders)")
     ap.add_argument("--columns-file", required=True, help="Columns spec (TMDL-style blocks or simple CSV-like lines)")
     ap.add_argument("--partition-file", required=True, help="M block (let...in) for this table")
-    args = ap.parse_args()
+    args = ap.parse_args(argv)
 
     xml_path = Path(args.xml)
     template_dir = Path(args.pbip_template)
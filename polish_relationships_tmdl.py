@@ -2,16 +2,35 @@
 # polish_relationships_tmdl.py
 import argparse
 import re
+import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, NamedTuple, Optional
 
 REL_FILE = "relationships.tmdl"
+WRITE_BUFFER_SIZE = 128 * 1024
 
 REL_START_RE = re.compile(r"^\s*relationship\s+(?P<name>[^\s].*)\s*$")
-FROM_RE = re.compile(r"^\s*fromColumn:\s+(?P<table>[A-Za-z0-9_]+)\.\'(?P<col>.+)\'\s*$")
-TO_RE   = re.compile(r"^\s*toColumn:\s+(?P<table>[A-Za-z0-9_]+)\.\'(?P<col>.+)\'\s*$")
+# fromColumn / toColumn in one pattern
+FROM_TO_RE = re.compile(r"^\s*(?P<key>fromColumn|toColumn):\s+(?P<table>[A-Za-z0-9_]+)\.\'(?P<col>.+)\'\s*$")
+# fromColumn/toColumn → (table key, raw column key) in the parsed dict
+FROM_TO_KEYS = {
+    "fromColumn": ("from_table", "from_column_raw"),
+    "toColumn": ("to_table", "to_column_raw"),
+}
 XFB_RE  = re.compile(r"^\s*crossFilteringBehavior:\s+(?P<xfb>\S+)\s*$")
-
+SUFFIX_PAREN_RE = re.compile(r"^(.*?)[ ]*\(([^\)]+)\)$")
+
+class Relationship(NamedTuple):
+    """One parsed relationship block (column names already normalized)."""
+    name: str
+    from_table: str
+    from_column: str
+    to_table: str
+    to_column: str
+    crossFilteringBehavior: Optional[str] = None
+
+@lru_cache(maxsize=None)  # pure; the same (col, table) pairs recur across blocks and --keep
 def _strip_table_suffix(col: str, table: str) -> str:
     """
     Normalize column names that may carry '(Table)' suffix (with optional spaces).
@@ -20,7 +39,9 @@ def _strip_table_suffix(col: str, table: str) -> str:
       Region (People)    -> Region
     """
     col = (col or "").strip().strip("'").strip('"')
-    m = re.match(r"^(.*?)[ ]*\(([^\)]+)\)$", col)
+    if not col.endswith(")") or "(" not in col:
+        return col  # common case: no suffix, skip the regex
+    m = SUFFIX_PAREN_RE.match(col)
     if m and m.group(2).strip().lower() == (table or "").strip().lower():
         return m.group(1).strip()
     return col
@@ -37,97 +58,99 @@ def _parse_keep_list(keep_arg: Optional[str]) -> List[Tuple[str, str, str, str]]
     parts = [p.strip() for p in keep_arg.split(",") if p.strip()]
     keep = []
     for part in parts:
-        if "=" not in part or "." not in part:
+        # one partition per separator; entries missing "=" or a "." on either side are skipped
+        left, eq, right = part.partition("=")
+        lt, ldot, lc = left.partition(".")
+        rt, rdot, rc = right.partition(".")
+        if not (eq and ldot and rdot):
             continue
-        left, right = part.split("=", 1)
-        lt, lc = left.split(".", 1)
-        rt, rc = right.split(".", 1)
         lc = _strip_table_suffix(lc, lt)
         rc = _strip_table_suffix(rc, rt)
-        keep.append((lt.strip(), lc, rt.strip(), rc))
+        keep.append((sys.intern(lt.strip()), lc, sys.intern(rt.strip()), rc))
     return keep
 
-def _read_relationships(path: Path) -> List[Dict[str, str]]:
+def _read_relationships(path: Path) -> List[Relationship]:
     """
     Very small TMDL reader for relationship blocks we emit.
     """
-    if not path.exists():
+    try:
+        # raw bytes + decode skips the text-IO layer; splitlines handles \r\n
+        rows = path.read_bytes().decode("utf-8").splitlines()
+    except FileNotFoundError:
         return []
-
-    rows = path.read_text(encoding="utf-8").splitlines()
-    rels: List[Dict[str, str]] = []
+    blocks: List[Dict[str, str]] = []
     cur: Dict[str, str] = {}
     in_block = False
 
     for line in rows:
-        m = REL_START_RE.match(line)
-        if m:
-            if in_block and cur:
-                rels.append(cur)
-            cur = {"name": m.group("name")}
-            in_block = True
-            continue
+        # Dispatch on the leading keyword so each line runs at most one regex
+        s = line.lstrip()
+        if s.startswith("relationship"):
+            m = REL_START_RE.match(line)
+            if m:
+                if in_block and cur:
+                    blocks.append(cur)
+                cur = {"name": m.group("name")}
+                in_block = True
+                continue
 
         if not in_block:
             continue
 
-        m = FROM_RE.match(line)
-        if m:
-            cur["from_table"] = m.group("table")
-            cur["from_column_raw"] = m.group("col")
-            continue
-
-        m = TO_RE.match(line)
-        if m:
-            cur["to_table"] = m.group("table")
-            cur["to_column_raw"] = m.group("col")
-            continue
-
-        m = XFB_RE.match(line)
-        if m:
-            cur["crossFilteringBehavior"] = m.group("xfb")
-            continue
+        if s.startswith(("fromColumn", "toColumn")):
+            m = FROM_TO_RE.match(line)
+            if m:
+                table_key, col_key = FROM_TO_KEYS[m.group("key")]
+                cur[table_key] = m.group("table")
+                cur[col_key] = m.group("col")
+        elif s.startswith("crossFilteringBehavior"):
+            m = XFB_RE.match(line)
+            if m:
+                cur["crossFilteringBehavior"] = m.group("xfb")
 
         # blank or unrelated lines end the block (when we hit a new relationship, handled above)
 
     if in_block and cur:
-        rels.append(cur)
-
-    # Normalize column names now
-    for r in rels:
-        lt = r.get("from_table") or ""
-        rt = r.get("to_table") or ""
-        r["from_column"] = _strip_table_suffix(r.get("from_column_raw", ""), lt)
-        r["to_column"]   = _strip_table_suffix(r.get("to_column_raw", ""), rt)
-
+        blocks.append(cur)
+
+    # Normalize column names now; table names repeat across blocks, so intern
+    # them (one shared object each, identity-fast in --keep tuple compares)
+    rels: List[Relationship] = []
+    for b in blocks:
+        lt = sys.intern(b.get("from_table") or "")
+        rt = sys.intern(b.get("to_table") or "")
+        rels.append(Relationship(
+            b["name"],
+            lt,
+            _strip_table_suffix(b.get("from_column_raw", ""), lt),
+            rt,
+            _strip_table_suffix(b.get("to_column_raw", ""), rt),
+            b.get("crossFilteringBehavior"),
+        ))
     return rels
 
-def _write_relationships(path: Path, rels: List[Dict[str, str]]) -> None:
-    lines: List[str] = []
-    for r in rels:
-        name = r.get("name", "relationship")
-        lt   = r.get("from_table")
-        lc   = r.get("from_column")
-        rt   = r.get("to_table")
-        rc   = r.get("to_column")
-        xfb  = r.get("crossFilteringBehavior")
-
-        if not (lt and lc and rt and rc):
-            continue
-
-        lines.append(f"relationship {name}")
-        lines.append(f"  fromColumn: {lt}.'{lc}'")
-        lines.append(f"  toColumn: {rt}.'{rc}'")
-        if xfb:
-            lines.append(f"  crossFilteringBehavior: {xfb}")
-        lines.append("")  # blank line
-
-    path.write_text("\n".join(lines).rstrip() + "\n", encoding="utf-8")
-
-def _should_drop_local_date_table(rel: Dict[str, str]) -> bool:
+def _write_relationships(path: Path, rels: List[Relationship]) -> None:
+    # Stream blocks through one large buffered handle instead of building the
+    # whole file in memory first
+    with open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        w = f.write
+        sep = ""
+        for name, lt, lc, rt, rc, xfb in rels:
+            if not (lt and lc and rt and rc):
+                continue
+
+            # blank line between blocks, none after the last one
+            w(f"{sep}relationship {name}\n  fromColumn: {lt}.'{lc}'\n  toColumn: {rt}.'{rc}'\n")
+            if xfb:
+                w(f"  crossFilteringBehavior: {xfb}\n")
+            sep = "\n"
+        if not sep:
+            w("\n")
+
+def _should_drop_local_date_table(rel: Relationship) -> bool:
     # drop relationships that involve LocalDateTable_*
-    lt = (rel.get("from_table") or "").lower()
-    rt = (rel.get("to_table") or "").lower()
+    lt = rel.from_table.lower()
+    rt = rel.to_table.lower()
     return lt.startswith("localdatetable_") or rt.startswith("localdatetable_")
 
 def main():
@@ -142,19 +165,16 @@ def main():
 
     # Normalize & filter
     keep_pairs = _parse_keep_list(args.keep)
-    keep_set = {f"{lt}.{lc}={rt}.{rc}" for (lt, lc, rt, rc) in keep_pairs}
+    # tuples hash without building a formatted string per relationship
+    keep_set = frozenset(keep_pairs)
 
-    filtered: List[Dict[str, str]] = []
+    filtered: List[Relationship] = []
     for r in rels:
         if args.drop_localdatetable and _should_drop_local_date_table(r):
             continue
 
         # Build normalized key for matching
-        lt = r.get("from_table") or ""
-        lc = r.get("from_column") or ""
-        rt = r.get("to_table") or ""
-        rc = r.get("to_column") or ""
-        key = f"{lt}.{lc}={rt}.{rc}"
+        key = (r.from_table, r.from_column, r.to_table, r.to_column)
 
         if keep_set:
             # keep only those explicitly allowed
@@ -168,11 +188,7 @@ def main():
         # Show what we detected to help caller adjust --keep
         detected = []
         for r in rels:
-            lt = r.get("from_table") or ""
-            lc = r.get("from_column") or ""
-            rt = r.get("to_table") or ""
-            rc = r.get("to_column") or ""
-            detected.append(f"{lt}.'{lc}' = {rt}.'{rc}'")
+            detected.append(f"{r.from_table}.'{r.from_column}' = {r.to_table}.'{r.to_column}'")
         print("[ERROR] All relationships would be removed. Detected:")
         for d in detected:
             print(f"  {d}")
@@ -17,145 +17,143 @@
 #   - Asegura "annotation PBI_ResultType = Table" al final (indent 2)
 
 import argparse
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-RE_COL_LABEL  = re.compile(r"^\s*columns\s*:\s*$", re.IGNORECASE)
-RE_PART_LABEL = re.compile(r"^\s*partitions\s*:\s*$", re.IGNORECASE)
+IO_BUFFER_SIZE = 1 << 17  # 128 KB
+PARALLEL_MIN_FILES = 4    # por debajo, arrancar procesos cuesta más que el trabajo
+
+# "columns:" / "partitions:" en una sola pasada
+RE_LABEL      = re.compile(r"^\s*(?:columns|partitions)\s*:\s*$", re.IGNORECASE)
 
 RE_TABLE      = re.compile(r"^\s*table\b", re.IGNORECASE)
 RE_T_LINEAGE  = re.compile(r"^\s*lineageTag\s*:\s*", re.IGNORECASE)
 
 RE_COLUMN     = re.compile(r"^\s*column\b", re.IGNORECASE)
-RE_COL_PROP   = re.compile(r"^\s*(dataType|formatString|lineageTag|summarizeBy|sourceColumn)\s*:\s*", re.IGNORECASE)
 RE_COL_ANN    = re.compile(r"^\s*annotation\b", re.IGNORECASE)
 
 RE_VARIATION  = re.compile(r"^\s*variation\b", re.IGNORECASE)
-RE_VAR_PROP   = re.compile(r"^\s*(isDefault|relationship\s*:|defaultHierarchy\s*:)", re.IGNORECASE)
 
 RE_PARTITION  = re.compile(r"^\s*partition\b.*=\s*m\s*$", re.IGNORECASE)
-RE_MODE       = re.compile(r"^\s*mode\s*:\s*", re.IGNORECASE)
-RE_SOURCE     = re.compile(r"^\s*source\s*=", re.IGNORECASE)
-RE_LET        = re.compile(r"^\s*let\s*$", re.IGNORECASE)
-RE_IN         = re.compile(r"^\s*in\s*$", re.IGNORECASE)
-RE_MLINE      = re.compile(r"^\s*(Source\s*=|srcSource\s*=|[A-Za-z0-9_]+_object\s*=)", re.IGNORECASE)
-
-def indent(level: int, s: str) -> str:
-    return (" " * level) + s.strip()
+# Líneas dentro de la partición: un solo match; lastgroup dice qué tipo es
+#   prop  -> mode: / source =          (4)
+#   letin -> let / in                  (6)
+#   mline -> srcSource = / X_object =  (8)  ("Source =" ya cae en prop)
+#   ann   -> annotation ...            (2)
+RE_PART_LINE  = re.compile(
+    r"^\s*(?:(?P<prop>mode\s*:|source\s*=)|(?P<letin>(?:let|in)\s*$)"
+    r"|(?P<mline>srcSource\s*=|[A-Za-z0-9_]+_object\s*=)|(?P<ann>annotation\b))",
+    re.IGNORECASE,
+)
+# Indent por tipo de línea de partición (sin match -> 6)
+PART_INDENT = {"prop": 4, "letin": 6, "mline": 8, "ann": 2}
+
+# Prefijos de indent ya codificados (niveles 0/2/4/6/8)
+INDENTS = {n: b" " * n for n in (0, 2, 4, 6, 8)}
 
 def polish_file(p: Path) -> None:
-    text = p.read_text(encoding="utf-8")
-    lines = text.splitlines()
+    # bytes + decode: sin capa TextIOWrapper (splitlines ya maneja \r\n)
+    with open(p, "rb", buffering=IO_BUFFER_SIZE) as f:
+        data = f.read()
+    lines = data.decode("utf-8").splitlines()
+
+    # Salida directa a un solo buffer de bytes (sin lista + join + encode)
+    buf = bytearray()
+
+    def emit(level: int, s: str) -> None:
+        buf.extend(INDENTS[level])
+        buf.extend(s.encode("utf-8"))
+        buf.append(0x0A)  # "\n"
 
-    out = []
     state = "root"          # root | in_column | in_variation | in_partition | in_let
     skip_next_blank = False
 
     for raw in lines:
-        ln = raw.rstrip()
+        s = raw.strip()     # una sola vez por línea
 
         # Elimina labels
-        if RE_COL_LABEL.match(ln) or RE_PART_LABEL.match(ln):
+        if s and RE_LABEL.match(s):
             skip_next_blank = True
             continue
-        if skip_next_blank and not ln.strip():
+        if skip_next_blank and not s:
             continue
         skip_next_blank = False
 
-        s = ln.strip()
         if not s:
-            out.append("")   # conservar líneas en blanco
+            buf.append(0x0A)   # conservar líneas en blanco
             continue
 
-        # Transiciones de estado
-        if RE_TABLE.match(s):
+        # Transiciones de estado (startswith filtra antes de llamar al regex)
+        low = s[:9].lower()
+        if low.startswith("table") and RE_TABLE.match(s):
             state = "root"
-            out.append(s)  # "table X" sin indent extra
+            emit(0, s)  # "table X" sin indent extra
             continue
 
         if state == "root" and RE_T_LINEAGE.match(s):
-            out.append(indent(2, s))
+            emit(2, s)
             continue
 
-        if RE_COLUMN.match(s):
+        if low.startswith("column") and RE_COLUMN.match(s):
             state = "in_column"
-            out.append(indent(2, s))
+            emit(2, s)
             continue
 
-        if RE_PARTITION.match(s):
+        if low.startswith("partition") and RE_PARTITION.match(s):
             state = "in_partition"
-            out.append(indent(2, s))
+            emit(2, s)
             continue
 
         # ---- dentro de columna ----
         if state == "in_column":
+            # variation cambia de estado; dataType, formatString, lineageTag, summarizeBy,
+            # sourceColumn, annotation y cualquier otra cosa van a 4 espacios
             if RE_VARIATION.match(s):
                 state = "in_variation"
-                out.append(indent(4, s))
-                continue
-            if RE_COL_PROP.match(s):
-                # dataType, formatString, lineageTag, summarizeBy, sourceColumn -> 4 espacios
-                out.append(indent(4, s))
-                continue
-            if RE_COL_ANN.match(s):
-                out.append(indent(4, s))
-                continue
-            # cualquier otra cosa en columna, deja a 4 por seguridad
-            out.append(indent(4, s))
+            emit(4, s)
             continue
 
         # ---- dentro de variation ----
         if state == "in_variation":
-            if RE_VAR_PROP.match(s):
-                out.append(indent(6, s))
-                continue
-            # línea en blanco u otra cosa -> mantén 6 si parece prop; si no, baja a columna
-            if s:  # algo no reconocido, trátalo como prop
-                out.append(indent(6, s))
-                continue
+            # isDefault, relationship:, defaultHierarchy: o algo no reconocido -> 6
+            emit(6, s)
+            continue
 
         # ---- dentro de partición ----
         if state == "in_partition":
-            if RE_MODE.match(s) or RE_SOURCE.match(s):
+            m = RE_PART_LINE.match(s)
+            kind = m.lastgroup if m else None
+            if kind == "prop":
                 # normaliza "source =" y su indent
                 s = s.replace("  ", " ")
                 s = s.replace("=  ", "= ")
-                out.append(indent(4, s))
-                continue
-            if RE_LET.match(s) or RE_IN.match(s):
-                out.append(indent(6, s))
-                # cuando vemos "in", seguimos en in_partition (el bloque M sigue)
-                continue
-            if RE_MLINE.match(s):
-                out.append(indent(8, s))
-                continue
-            if RE_COL_ANN.match(s):
-                # annotation PBI_ResultType (aunque suele ir fuera, toleramos aquí)
-                out.append(indent(2, s))
-                continue
-            # fallback dentro de partición
-            out.append(indent(6, s))
+            # cuando vemos "in", seguimos en in_partition (el bloque M sigue);
+            # annotation PBI_ResultType a 2 (aunque suele ir fuera, toleramos aquí)
+            emit(PART_INDENT.get(kind, 6), s)
             continue
 
         # ---- fuera de bloques: annotations de nivel tabla, etc. ----
         if RE_COL_ANN.match(s):
-            out.append(indent(2, s))
+            emit(2, s)
             continue
 
-        # fallback general
-        out.append(s)
-
-        # Heurística de salida de estados:
-        if RE_TABLE.match(s) or RE_PARTITION.match(s) or RE_COLUMN.match(s):
-            # el próximo ciclo ajustará state
-            pass
+        # fallback general (el próximo ciclo ajustará state)
+        emit(0, s)
 
     # Asegura annotation final
-    body = "\n".join(out).rstrip()
-    if "annotation PBI_ResultType = Table" not in body:
-        body += "\n\n  annotation PBI_ResultType = Table"
+    body = buf.rstrip()
+    if b"annotation PBI_ResultType = Table" not in body:
+        body += b"\n\n  annotation PBI_ResultType = Table"
+    body.append(0x0A)
 
-    p.write_text(body + "\n", encoding="utf-8")
+    # Ya pulido (re-ejecución sin cambios) → no reescribir
+    if body == data:
+        return
+
+    with open(p, "wb", buffering=IO_BUFFER_SIZE) as f:
+        f.write(body)
 
 def main():
     ap = argparse.ArgumentParser("Polish TMDL tables (indent exacto y sin labels)")
@@ -163,11 +161,19 @@ def main():
     args = ap.parse_args()
 
     tables_dir = Path(args.definition_dir) / "tables"
-    if not tables_dir.exists():
+    # Un solo scandir: el dirent ya trae el tipo, sin stat por archivo
+    try:
+        with os.scandir(tables_dir) as it:
+            files = sorted(Path(e.path) for e in it if e.name.endswith(".tmdl") and e.is_file())
+    except FileNotFoundError:
         raise SystemExit(f"Not found tables dir: {tables_dir}")
-
-    for f in sorted(tables_dir.glob("*.tmdl")):
-        polish_file(f)
+    if len(files) < PARALLEL_MIN_FILES:
+        for f in files:
+            polish_file(f)
+    else:
+        # Cada archivo es independiente → en paralelo
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+            list(ex.map(polish_file, files, chunksize=4))
 
     print("✅ TMDL tables polished (indent exacto y sin labels).")
 
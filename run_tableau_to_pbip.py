@@ -25,20 +25,28 @@ Usage examples:
     --provider azure --model "gpt-5-mini" --tables Orders,People,Returned
 
 Notes:
-  - This script *does not* change your existing scripts. It calls them via subprocess.
+  - This script *does not* change your existing scripts. It imports each one once and calls its main()
+    in-process (via subprocess only when --python-bin names a different interpreter).
   - It auto-discovers table names from the XML when --tables ALL (default).
   - It removes the existing PBIP output folder if --force is specified (fresh run).
 """
 
 import argparse
+import importlib.util
 import os
 import re
 import sys
 import json
 import shutil
 import subprocess
+import traceback
+import xml.etree.ElementTree as ET
 from pathlib import Path
 
+# [schema].[TableName]
+_QUALIFIED_NAME_RE = re.compile(r"\[([^\]]+)\]\.\[([^\]]+)\]")
+_TABLE_ATTR_RE = re.compile(r'table\s*=\s*"([^"]+)"', re.IGNORECASE)
+
 
 def load_dotenv_if_exists(project_root: Path):
     env_file = project_root / ".env"
@@ -56,29 +64,47 @@ def load_dotenv_if_exists(project_root: Path):
         os.environ[key] = val
 
 
+def _table_name(value: str) -> str:
+    # if it's already schema-qualified, keep the last chunk
+    if value.startswith("[") and "].[" in value:
+        m = _QUALIFIED_NAME_RE.search(value)
+        if m:
+            return m.group(2)
+        return ""
+    # plain name
+    return value
+
+
+def _discover_tables_regex(xml_path: Path):
+    # Text-level fallback for XML the parser rejects
+    text = xml_path.read_text(encoding="utf-8", errors="ignore")
+    tables = {tbl for (_schema, tbl) in _QUALIFIED_NAME_RE.findall(text)}
+    tables.update(filter(None, map(_table_name, _TABLE_ATTR_RE.findall(text))))
+    return tables
+
+
 def discover_tables_from_xml(xml_path: Path):
     """
-    Heuristic discovery of table names from a Tableau datasource XML.
-    Looks for patterns like [schema].[TableName] or attributes table="[schema].[TableName]".
+    Discovery of table names from a Tableau datasource XML.
+    Streams the XML and collects table="[schema].[TableName]" (or table="TableName") attributes;
+    falls back to a text scan for [schema].[TableName] patterns if parsing finds nothing.
     Returns a sorted list of unique table names (without schema).
     """
     if not xml_path.exists():
         raise FileNotFoundError(f"XML not found: {xml_path}")
-    text = xml_path.read_text(encoding="utf-8", errors="ignore")
-    # Matches [schema].[TableName]
-    matches = re.findall(r"\[([^\]]+)\]\.\[([^\]]+)\]", text)
-    tables = {tbl for (_schema, tbl) in matches}
-    # Also try to get direct 'table="TableName"' (no schema) occurrences
-    matches2 = re.findall(r'table\s*=\s*"([^"]+)"', text, flags=re.IGNORECASE)
-    for m in matches2:
-        # if it's already schema-qualified, split to get the last chunk
-        if m.startswith("[") and "].[" in m:
-            m2 = re.findall(r"\[([^\]]+)\]\.\[([^\]]+)\]", m)
-            if m2:
-                tables.add(m2[0][1])
-        else:
-            # plain name
-            tables.add(m)
+    tables = set()
+    try:
+        for _event, elem in ET.iterparse(xml_path):
+            value = elem.get("table")
+            if value:
+                name = _table_name(value)
+                if name:
+                    tables.add(name)
+            elem.clear()  # keep memory flat on large workbooks
+    except ET.ParseError:
+        tables = set()
+    if not tables:
+        tables = _discover_tables_regex(xml_path)
     out = sorted(tables)
     return out
 
@@ -90,6 +116,41 @@ def run_cmd(cmd, cwd=None):
         raise SystemExit(f"Command failed with exit code {proc.returncode}: {' '.join(cmd)}")
 
 
+def load_script(path: Path):
+    """Import a pipeline script as a module (once), so its main() can be reused per table."""
+    # like `python script.py`: its own folder comes first for sibling imports (tmdl_io)
+    script_dir = str(path.parent)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def run_main(mod, script: Path, argv):
+    """
+    Call mod.main(argv), mirroring run_cmd: a non-zero exit or an uncaught
+    exception aborts the pipeline with the same message. argv is passed
+    explicitly (no sys.argv swap), so concurrent calls from worker threads are safe.
+    """
+    cmd = [str(script)] + argv
+    print("\n$ " + " ".join(cmd))
+    try:
+        mod.main(argv)
+    except SystemExit as e:
+        code = e.code
+        if isinstance(code, str):
+            print(code, file=sys.stderr)
+            code = 1
+        if code:
+            raise SystemExit(f"Command failed with exit code {code}: {' '.join(cmd)}")
+    except Exception:
+        # what a child interpreter does with an uncaught exception: traceback, exit code 1
+        traceback.print_exc()
+        raise SystemExit(f"Command failed with exit code 1: {' '.join(cmd)}")
+
+
 def main():
     ap = argparse.ArgumentParser(description="Run Tableau→BossStyle→PBIP pipeline with one command.")
     ap.add_argument("--project-root", required=True, help="Folder containing datasource_demo_tableau.xml, prompt.txt, pbip_template/, etc.")
@@ -99,10 +160,13 @@ def main():
     ap.add_argument("--template-name", default="PBIPTemplate.pbip", help="Template file name inside pbip_template/ (default: PBIPTemplate.pbip)")
     ap.add_argument("--pbip-name", default="SampleTableau.pbip", help="Name of the output PBIP folder (default: SampleTableau.pbip)")
     ap.add_argument("--force", action="store_true", help="If set, deletes OUT_PBIP/<pbip-name> before building (fresh run).")
+    ap.add_argument("--batch", action="store_true", help="Generate via the OpenAI Batch API (cheaper, non-interactive). Blocks until the batch is done "
+                    "(up to 24h); re-running after an interruption resumes the batch saved in out/.")
     ap.add_argument("--python-bin", default=sys.executable, help="Python interpreter to use (default: current python).")
     args = ap.parse_args()
 
-    project_root = Path(args.project_root).expanduser().resolve()
+    # Resolve once at entry; every child path below inherits the already-real root
+    project_root = Path(os.path.realpath(os.path.expanduser(args.project_root)))
     load_dotenv_if_exists(project_root)
 
     xml_path = project_root / "datasource_demo_tableau.xml"
@@ -138,35 +202,46 @@ def main():
 
     # Paths to the existing scripts (assumed to live in the same folder or project root)
     # Try to resolve them under project root first; otherwise fallback to current working dir.
+    cwd = os.getcwd()  # already absolute and symlink-free; no per-script resolve()
     t2b = project_root / "tableau_xml_to_bossstyle_ai.py"
     if not t2b.exists():
-        t2b = Path("tableau_xml_to_bossstyle_ai.py").resolve()
+        t2b = Path(cwd, "tableau_xml_to_bossstyle_ai.py")
     pbi_int = project_root / "pbip_integrate.py"
     if not pbi_int.exists():
-        pbi_int = Path("pbip_integrate.py").resolve()
+        pbi_int = Path(cwd, "pbip_integrate.py")
 
     if not t2b.exists():
         raise SystemExit(f"Cannot find tableau_xml_to_bossstyle_ai.py in {project_root} or CWD.")
     if not pbi_int.exists():
         raise SystemExit(f"Cannot find pbip_integrate.py in {project_root} or CWD.")
 
-    # Step 1: Generate boss-style columns and M partitions for each table
-    for tbl in tables:
-        cols_file = out_dir / f"{tbl}_columns_boss_style.txt"
-        part_file = out_dir / f"{tbl}_partition.m"
+    # Same interpreter → import each script once instead of paying interpreter
+    # start-up + imports for every table and step
+    in_process = os.path.realpath(args.python_bin) == os.path.realpath(sys.executable)
+    if in_process:
+        t2b_mod = load_script(t2b)
+        pbi_int_mod = load_script(pbi_int)
 
-        cmd_gen = [
-            args.python_bin, str(t2b),
+    # Step 1: Generate boss-style columns and M partitions for all tables in one call:
+    # the XML is parsed once and every table's LLM requests run concurrently.
+    if tables:
+        argv_gen = [
             "--input", str(xml_path),
             "--out-dir", str(out_dir),
             "--provider", args.provider,
             "--model", args.model,
             "--prompt-file", str(prompt_path),
-            "--table", tbl
         ]
-        run_cmd(cmd_gen)
+        for tbl in tables:
+            argv_gen += ["--table", tbl]
+        if args.batch:
+            argv_gen.append("--batch")
+        if in_process:
+            run_main(t2b_mod, t2b, argv_gen)
+        else:
+            run_cmd([args.python_bin, str(t2b)] + argv_gen)
 
-    # Step 2: Integrate into PBIP for each table
+    # Step 2: Integrate into PBIP for each table (sequential: every table updates the same PBIP)
     # The first call creates the PBIP from the template. Subsequent calls add tables into the same PBIP.
     for idx, tbl in enumerate(tables):
         cols_file = out_dir / f"{tbl}_columns_boss_style.txt"
@@ -176,8 +251,7 @@ def main():
         if not part_file.exists():
             raise SystemExit(f"Missing partition file for {tbl}: {part_file}")
 
-        cmd_pbi = [
-            args.python_bin, str(pbi_int),
+        argv_pbi = [
             "--xml", str(xml_path),
             "--pbip-template", str(tmdl_template),
             "--pbip-out", str(pbip_out),
@@ -185,7 +259,10 @@ def main():
             "--columns-file", str(cols_file),
             "--partition-file", str(part_file)
         ]
-        run_cmd(cmd_pbi)
+        if in_process:
+            run_main(pbi_int_mod, pbi_int, argv_pbi)
+        else:
+            run_cmd([args.python_bin, str(pbi_int)] + argv_pbi)
 
     print("\n✅ Done!")
     print(f"PBIP created at: {pbip_out}")
@@ -8,39 +8,252 @@
 # Usage (as your run_all.sh does):
 #   python scaffold_pbip.py --project-root /path/to/project --pbip-name SampleTableau.pbip --force
 
-import argparse
-import json
-import shutil
+# argparse / json / shutil / concurrent.futures are imported where they are used:
+# they are only needed on some paths and are the bulk of this script's cold start.
+import errno
+import os
 import sys
+from functools import partial
 from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    import orjson  # optional: faster pbir parse/serialize
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl  # Linux/macOS; used for the FICLONE reflink ioctl
+except ImportError:
+    fcntl = None
+
+# copy helpers take plain str paths too (tree walks build them by string join, no Path objects)
+StrPath = Union[str, "os.PathLike[str]"]
+
+COPY_BUFSIZE = 1 << 20  # 1 MiB for the userspace fallback
 
 def ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 def rm_tree(p: Path) -> None:
     if p.exists():
+        import shutil
         shutil.rmtree(p)
 
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+# errnos meaning "this copy mechanism isn't available for these two files"
+_NO_KERNEL_COPY = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP}
+
+def _fast_copy(src: StrPath, dst: StrPath) -> None:
+    """
+    Byte-exact file copy done in the kernel where possible:
+    FICLONE reflink (CoW share, no bytes moved on Btrfs/XFS) → copy_file_range
+    → sendfile → 1 MiB read/write loop.
+    Each step continues from wherever the previous one stopped.
+    """
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "wb", buffering=0) as fdst:
+        sfd, dfd = fsrc.fileno(), fdst.fileno()
+        if fcntl is not None and sys.platform.startswith("linux"):
+            try:
+                fcntl.ioctl(dfd, FICLONE, sfd)
+                return
+            except OSError:
+                pass  # not a reflink-capable fs (or cross-device); copy instead
+        remaining = os.fstat(sfd).st_size
+        if remaining and hasattr(os, "copy_file_range"):
+            try:
+                while remaining > 0:
+                    n = os.copy_file_range(sfd, dfd, remaining)
+                    if n == 0:
+                        break
+                    remaining -= n
+            except OSError as e:
+                if e.errno not in _NO_KERNEL_COPY:
+                    raise
+        if remaining and hasattr(os, "sendfile"):
+            try:
+                while remaining > 0:
+                    n = os.sendfile(dfd, sfd, None, remaining)
+                    if n == 0:
+                        break
+                    remaining -= n
+            except OSError as e:
+                if e.errno not in _NO_KERNEL_COPY:
+                    raise
+        if remaining:
+            import shutil
+            shutil.copyfileobj(fsrc, fdst, COPY_BUFSIZE)
+
+def _write_file(path: StrPath, data: bytes, drop_cache: bool = False) -> None:
+    """
+    Write data with raw os.write on an O_TRUNC fd (no buffered/text writer for these small files).
+    drop_cache: the file is final output no later step reads → flush it and hint the kernel
+    to drop its pages (POSIX_FADV_DONTNEED), so back-to-back scaffolds don't churn the cache.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        mv = memoryview(data)
+        while mv:
+            mv = mv[os.write(fd, mv):]
+        if drop_cache and hasattr(os, "posix_fadvise"):
+            # no fsync: Linux starts async writeback for dirty pages and drops the clean ones
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+def _iter_tmdl(d: Path) -> Iterator[os.DirEntry]:
+    """*.tmdl files in d, in directory order, yielded as scandir reads them (type from the dirent)."""
+    try:
+        with os.scandir(d) as it:
+            for e in it:
+                if e.name.endswith(".tmdl") and e.is_file():
+                    yield e
+    except FileNotFoundError:
+        return
+
+def _link_or_copy(src: StrPath, dst: StrPath) -> None:
+    """
+    Hardlink src → dst (no data moved), else _fast_copy. Only used with --link: a hardlinked
+    dst shares its inode with src, so editing either copy (e.g. in Power BI) changes both.
+    """
+    try:
+        os.unlink(dst)  # re-runs without --force: os.link won't replace
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, dst)
+    except OSError:
+        _fast_copy(src, dst)
+
+def _unshare(dst: StrPath) -> None:
+    """
+    Drop dst if it is a hardlink (left by an earlier --link run): writing through it
+    would also rewrite the source it shares an inode with.
+    """
+    try:
+        if os.lstat(dst).st_nlink > 1:
+            os.unlink(dst)
+    except FileNotFoundError:
+        pass
+
+def _copy_text_or_raw(src: StrPath, dst: StrPath, link: bool = False) -> None:
+    """
+    Byte-level copy with the old read_text/write_text result: UTF-8 files get their
+    CRLF/CR turned into LF (the template ships CRLF), anything else is copied raw.
+    Only files that actually contain b"\r" are UTF-8 validated; the rest go straight through.
+    link=True (--link, trees nothing edits afterwards): hardlink whenever the bytes would be
+    unchanged. Otherwise dst always gets its own inode.
+    """
+    with open(src, "rb") as f:
+        data = f.read()
+    if b"\r" in data:
+        try:
+            data.decode("utf-8")
+        except UnicodeDecodeError:
+            # binary or unknown encoding (report images, etc.) → raw copy
+            if link:
+                _link_or_copy(src, dst)
+            else:
+                _unshare(dst)
+                _fast_copy(src, dst)
+            return
+        # UTF-8 continuation bytes are >= 0x80, so byte-level replace == str-level replace
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    elif link:
+        _link_or_copy(src, dst)
+        return
+    _unshare(dst)
+    with open(dst, "wb") as f:
+        f.write(data)
+
+def _mirror_file(src: StrPath, dst: StrPath) -> None:
+    """
+    _copy_text_or_raw for re-runs without --force: skip when dst already carries src's
+    size + mtime (rsync-style quick check), and stamp src's times on every copy made.
+    """
+    st = os.stat(src)
+    try:
+        dt = os.stat(dst)
+        # a dst sharing src's inode always "matches" → recopy it so utime can't touch src
+        same_inode = (dt.st_ino, dt.st_dev) == (st.st_ino, st.st_dev)
+        if not same_inode and dt.st_size == st.st_size and dt.st_mtime_ns == st.st_mtime_ns:
+            return
+    except FileNotFoundError:
+        pass
+    _copy_text_or_raw(src, dst)  # link=False: dst gets its own inode
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def _run_copies(copy: Callable[[StrPath, StrPath], None], jobs: Iterable[Tuple[StrPath, StrPath]]) -> None:
+    """
+    Run independent file copies concurrently (pure I/O, so threads overlap the syscalls).
+    jobs may be a generator: each copy is submitted as soon as it is yielded.
+    """
+    workers = min(32, (os.cpu_count() or 1) * 4)
+    if isinstance(jobs, list):
+        if not jobs:
+            return
+        workers = min(workers, len(jobs))
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        list(ex.map(lambda job: copy(*job), jobs))
+
+def _tree_copy_jobs(src_root: Path, dst_root: Path) -> List[Tuple[str, str]]:
+    """
+    Create the destination directories (serially, each once) and return the (src, dst) file pairs.
+    Walks with os.scandir, so dir/file comes from the dirent instead of a stat per entry;
+    paths are plain strings (e.path + string join), no Path object / relative_to per entry.
+    """
+    with os.scandir(src_root) as it:
+        top = list(it)
+    if top:
+        ensure_dir(dst_root)
+    jobs = []
+    stack = [(top, os.fspath(dst_root))]
+    while stack:
+        entries, dst_dir = stack.pop()
+        for e in entries:
+            dst = os.path.join(dst_dir, e.name)
+            if e.is_dir():
+                os.makedirs(dst, exist_ok=True)
+                with os.scandir(e.path) as it:
+                    stack.append((list(it), dst))
+            else:
+                jobs.append((e.path, dst))
+    return jobs
+
+def _scan(d: Path) -> Dict[str, os.DirEntry]:
+    """One getdents pass over d: name → DirEntry (file/dir type comes from the dirent, no stat)."""
+    with os.scandir(d) as it:
+        return {e.name: e for e in it}
+
 def _find_sem_model_dir(pbip_dir: Path) -> Path:
     """Inside the intermediate PBIP folder (<Base>.pbip), find the semantic model root."""
+    present = _scan(pbip_dir)
     for name in ("SemanticModel", "smtemplate.SemanticModel", "template.SemanticModel"):
-        cand = pbip_dir / name
-        if cand.exists() and cand.is_dir():
-            return cand
+        e = present.get(name)
+        if e is not None and e.is_dir():
+            return pbip_dir / name
     raise FileNotFoundError(f"No SemanticModel folder found under {pbip_dir}")
 
 def _find_report_dir(pbip_dir: Path) -> Path:
     """Inside the intermediate PBIP folder (<Base>.pbip), find the report root."""
+    present = _scan(pbip_dir)
     for name in ("Report", "rtemplate.Report", "template.Report"):
-        cand = pbip_dir / name
-        if cand.exists() and cand.is_dir():
-            return cand
+        e = present.get(name)
+        if e is not None and e.is_dir():
+            return pbip_dir / name
     raise FileNotFoundError(f"No Report folder found under {pbip_dir}")
 
-def _copy_definition(src_sem: Path, dst_sem: Path) -> None:
-    """Copy 'definition' (and .pbi if present) from src_sem to dst_sem."""
+def _copy_definition(src_sem: Path, dst_sem: Path, link: bool = False) -> None:
+    """
+    Copy 'definition' (and .pbi if present) from src_sem to dst_sem.
+    link (--link): hardlink the .pbi editor files instead of copying them.
+    """
     src_def = src_sem / "definition"
-    if not src_def.exists():
+    try:
+        present = _scan(src_def)
+    except FileNotFoundError:
         raise SystemExit(f"[ERROR] Source definition folder not found: {src_def}")
 
     # Copy definition root files
@@ -49,63 +262,37 @@ def _copy_definition(src_sem: Path, dst_sem: Path) -> None:
 
     # subfolder: tables
     ensure_dir(dst_def / "tables")
-    tables_src = src_def / "tables"
-    if tables_src.exists():
-        for tmdl in tables_src.glob("*.tmdl"):
-            (dst_def / "tables" / tmdl.name).write_text(tmdl.read_text(encoding="utf-8"), encoding="utf-8")
+    if "tables" in present:
+        # generated by pbip_integrate (already UTF-8 / LF) → raw kernel copy, no decode/encode
+        # copy order is irrelevant → stream straight from scandir, no list/sort before the first copy
+        dst_tables = dst_def / "tables"
+        _run_copies(_fast_copy, ((e.path, dst_tables / e.name) for e in _iter_tmdl(src_def / "tables")))
     else:
         print(f"[WARN] No 'tables' folder in {src_def}; continuing")
 
     # other files in definition (database.tmdl, model.tmdl, relationships.tmdl, cultures/, etc.)
-    for item in src_def.iterdir():
-        if item.name == "tables":
+    jobs = []
+    for name, e in present.items():
+        if name == "tables":
             continue
-        if item.is_file():
-            (dst_def / item.name).write_text(item.read_text(encoding="utf-8"), encoding="utf-8")
-        elif item.is_dir():
-            # shallow copy directories like cultures/
-            dst_sub = dst_def / item.name
-            ensure_dir(dst_sub)
-            for f in item.rglob("*"):
-                rel = f.relative_to(item)
-                dst_f = dst_sub / rel
-                if f.is_dir():
-                    ensure_dir(dst_f)
-                else:
-                    ensure_dir(dst_f.parent)
-                    dst_f.write_text(f.read_text(encoding="utf-8"), encoding="utf-8")
+        if e.is_file():
+            jobs.append((src_def / name, dst_def / name))
+        elif e.is_dir():
+            # directories like cultures/
+            ensure_dir(dst_def / name)
+            jobs.extend(_tree_copy_jobs(src_def / name, dst_def / name))
+    _run_copies(_copy_text_or_raw, jobs)
 
     # optional .pbi folder (editorSettings.json, etc.)
     src_pbi = src_sem / ".pbi"
     if src_pbi.exists():
-        for f in src_pbi.rglob("*"):
-            rel = f.relative_to(src_pbi)
-            dst_f = dst_sem / ".pbi" / rel
-            if f.is_dir():
-                ensure_dir(dst_f)
-            else:
-                ensure_dir(dst_f.parent)
-                try:
-                    dst_f.write_text(f.read_text(encoding="utf-8"), encoding="utf-8")
-                except UnicodeDecodeError:
-                    # binary or unknown encoding; copy raw
-                    ensure_dir(dst_f.parent)
-                    shutil.copy2(f, dst_f)
+        # editor state, never modified by this scaffold → linked instead of copied when opted in
+        _run_copies(partial(_copy_text_or_raw, link=link), _tree_copy_jobs(src_pbi, dst_sem / ".pbi"))
 
 def _copy_report(src_report: Path, dst_report: Path) -> None:
     """Copy the report folder (definition.pbir, etc.)."""
     ensure_dir(dst_report)
-    for f in src_report.rglob("*"):
-        rel = f.relative_to(src_report)
-        dst_f = dst_report / rel
-        if f.is_dir():
-            ensure_dir(dst_f)
-        else:
-            ensure_dir(dst_f.parent)
-            try:
-                dst_f.write_text(f.read_text(encoding="utf-8"), encoding="utf-8")
-            except UnicodeDecodeError:
-                shutil.copy2(f, dst_f)
+    _run_copies(_mirror_file, _tree_copy_jobs(src_report, dst_report))
 
 def _patch_pbir_to_relative(dst_report: Path) -> None:
     """
@@ -116,20 +303,29 @@ def _patch_pbir_to_relative(dst_report: Path) -> None:
     pbir = dst_report / "definition.pbir"
     if not pbir.exists():
         return
+    raw = pbir.read_bytes()
+    import json
     try:
-        data = json.loads(pbir.read_text(encoding="utf-8"))
+        # both accept UTF-8 bytes directly
+        data = orjson.loads(raw) if orjson is not None else json.loads(raw)
     except Exception:
         return
 
     # Very light patch: prefer relativeReferences if present in schema
     # We just write back the same JSON to normalize formatting; custom patches can be added here
-    pbir.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    if orjson is not None:
+        out = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+    else:
+        out = (json.dumps(data, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+    if out != raw:  # already normalized: don't touch the file
+        _write_file(pbir, out, drop_cache=True)
 
 def _write_manifest(final_root: Path, base: str) -> None:
     """
     Write a minimal <Base>.pbip manifest that points to <Base>.Report and <Base>.SemanticModel.
     Power BI Desktop accepts a simple JSON with 'artifacts'.
     """
+    import json
     manifest_path = final_root / f"{base}.pbip"
     manifest = {
         "version": "1.0",
@@ -138,14 +334,18 @@ def _write_manifest(final_root: Path, base: str) -> None:
             {"location": f"{base}.SemanticModel", "type": "SemanticModel"}
         ]
     }
-    manifest_path.write_text(json.dumps(manifest, indent=2) + "\n", encoding="utf-8")
+    _write_file(manifest_path, (json.dumps(manifest, indent=2) + "\n").encode("utf-8"), drop_cache=True)
 
-def main():
+def main(argv: Optional[List[str]] = None):
+    import argparse
     ap = argparse.ArgumentParser("PBIP scaffold (template model + generated TMDLs)")
     ap.add_argument("--project-root", required=True)
     ap.add_argument("--pbip-name", required=True)
     ap.add_argument("--force", action="store_true")
-    args = ap.parse_args()
+    ap.add_argument("--link", action="store_true",
+                    help="Hardlink unchanged .pbi editor files instead of copying them (the final "
+                         "folder then shares those files with OUT_PBIP/<Base>.pbip)")
+    args = ap.parse_args(argv)
 
     root = Path(args.project_root)
     base = args.pbip_name[:-5] if args.pbip_name.endswith(".pbip") else args.pbip_name
@@ -169,7 +369,7 @@ def main():
     dst_report = final_root / f"{base}.Report"
 
     # Copy
-    _copy_definition(src_sem, dst_sem)
+    _copy_definition(src_sem, dst_sem, link=args.link)
     _copy_report(src_report, dst_report)
     _patch_pbir_to_relative(dst_report)
 
@@ -6,10 +6,15 @@ Reads a Tableau datasource XML, narrows context for a given table, and uses an L
 (Azure OpenAI or OpenAI) to produce:
   - <Table>_columns_boss_style.txt      (boss-style YAML-like spec for columns)
   - <Table>_partition.m                 (Power Query M partition block, via AI prompt)
-  - context.json                        (narrowed JSON context sent to the LLM)
+  - context.json                        (narrowed JSON context sent to the LLM;
+                                         <Table>_context.json when several tables are given)
+
+--table can be repeated: the XML is parsed once and all tables' LLM calls run concurrently.
 
 It also validates that the model covered ALL columns found in the Tableau XML.
 If there are omissions, it retries up to 2 times with feedback listing missing columns.
+At most LOCAL_FILL_MAX_MISSING (5) columns still missing are then filled in locally from
+their metadata; those, or a larger gap left unfilled, are listed on stderr.
 
 USAGE (Azure OpenAI):
   export AZURE_OPENAI_API_KEY="..."
@@ -34,79 +39,163 @@ USAGE (OpenAI non-Azure):
     --prompt-file ./prompt.txt \
     --table Orders
 """
-import argparse, json, os, re, sys
-import xml.etree.ElementTree as ET
+import argparse, asyncio, hashlib, json, os, re, sys, time
+try:
+    # Optional: lxml (libxml2) parses large datasource XML much faster; same API
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+try:
+    import orjson  # optional: faster JSON for the context payloads
+except ImportError:
+    orjson = None
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, FrozenSet, List, Tuple, Optional
+
+def _dumps_bytes(obj: Any) -> bytes:
+    """json.dumps(obj, indent=2) as bytes; via orjson when installed (identical text for ASCII data)."""
+    if orjson is not None:
+        out = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+        if out.isascii():
+            return out
+        # non-ASCII: json.dumps escapes it as \uXXXX; keep that exact output
+    return json.dumps(obj, indent=2).encode("ascii")
+
+def _dumps(obj: Any) -> str:
+    return _dumps_bytes(obj).decode("ascii")
+
+def _dump_to(path: Path, obj: Any) -> None:
+    """Write obj as indent=2 JSON; the stdlib path streams chunks into the file (no full string)."""
+    if orjson is not None:
+        out = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+        if out.isascii():
+            path.write_bytes(out)
+            return
+    with open(path, "w", encoding="ascii") as f:
+        json.dump(obj, f, indent=2)
 
 # -------------------------------
 # XML parsing & context narrowing
 # -------------------------------
-def parse_tableau_xml(xml_path: str) -> Dict[str, Any]:
-    """Parse Tableau datasource XML into a lightweight dict structure."""
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-
-    # connection info (server, db)
-    named_conn = root.find(".//named-connections/named-connection/connection")
-    conn_info = {}
-    if named_conn is not None:
-        for k in ("server", "dbname", "class", "authentication"):
-            v = named_conn.attrib.get(k)
-            if v:
-                conn_info[k] = v
-
-    # relations: list of (name, table, type)
-    relations = []
-    for rel in root.findall(".//relation[@type='table']"):
-        relations.append({
-            "name": rel.attrib.get("name"),
-            "table": rel.attrib.get("table"),
-            "connection": rel.attrib.get("connection"),
-            "type": rel.attrib.get("type"),
-        })
+# <metadata-record> child tag → output key
+_MD_FIELDS = (
+    ("remote-name", "remote_name"),
+    ("local-name", "local_name"),
+    ("parent-name", "parent_name"),
+    ("local-type", "local_type"),
+    ("aggregation", "aggregation"),
+    ("precision", "precision"),
+    ("width", "width"),
+    ("contains-null", "contains_null"),
+    ("ordinal", "ordinal"),
+)
+
+def _metadata_record(rec) -> Dict[str, str]:
+    """One <metadata-record class='column'> → flat dict (one pass over its children)."""
+    vals = {}
+    for c in rec:
+        # first occurrence wins, like findtext
+        if c.tag not in vals:
+            vals[c.tag] = c.text
+    return {key: (vals.get(tag) or "") for tag, key in _MD_FIELDS}
+
+def _relationship_record(rel) -> Optional[Dict[str, Any]]:
+    """One object-graph <relationship> → ops + endpoint object ids (None if not a simple '=')."""
+    # single scan over the children instead of one find() per lookup
+    eq = left_ep = right_ep = None
+    for c in rel:
+        tag = c.tag
+        if tag == "expression":
+            if eq is None and c.get("op") == "=":
+                eq = c
+        elif tag == "first-end-point":
+            if left_ep is None:
+                left_ep = c
+        elif tag == "second-end-point":
+            if right_ep is None:
+                right_ep = c
+    if eq is None:
+        return None
+    parts = [c for c in eq if c.tag == "expression"]
+    if len(parts) != 2:
+        return None
+    left_op = parts[0].attrib.get("op", "")
+    right_op = parts[1].attrib.get("op", "")
+    return {
+        "left": left_op, "right": right_op,
+        "left_object_id": left_ep.attrib.get("object-id") if left_ep is not None else None,
+        "right_object_id": right_ep.attrib.get("object-id") if right_ep is not None else None
+    }
 
-    # metadata records (columns)
-    md_records = []
-    for rec in root.findall(".//metadata-records/metadata-record[@class='column']"):
-        md = {
-            "remote_name": (rec.findtext("remote-name") or ""),
-            "local_name": (rec.findtext("local-name") or ""),
-            "parent_name": (rec.findtext("parent-name") or ""),
-            "local_type": (rec.findtext("local-type") or ""),
-            "aggregation": (rec.findtext("aggregation") or ""),
-            "precision": (rec.findtext("precision") or ""),
-            "width": (rec.findtext("width") or ""),
-            "contains_null": (rec.findtext("contains-null") or ""),
-            "ordinal": (rec.findtext("ordinal") or ""),
-        }
-        md_records.append(md)
-
-    # object graph: objects and relationships
-    objects = []
-    for obj in root.findall(".//object-graph/objects/object"):
-        objects.append({
-            "caption": obj.attrib.get("caption"),
-            "id": obj.attrib.get("id"),
-        })
+def _release(elem) -> None:
+    """
+    Free a consumed element: clear its subtree and, with lxml, also unlink the
+    already-processed siblings before it (cleared elements otherwise stay attached
+    to their parent, so memory still grows with the record count).
+    """
+    elem.clear()
+    if hasattr(elem, "getprevious"):
+        parent = elem.getparent()
+        while elem.getprevious() is not None:
+            del parent[0]
 
+def parse_tableau_xml(xml_path: str) -> Dict[str, Any]:
+    """
+    Parse Tableau datasource XML into a lightweight dict structure.
+    Streams the file in one pass (iterparse) and clears each metadata record /
+    relationship once consumed, so the full DOM is never held in memory.
+    """
+    conn_info = {}          # connection info (server, db) of the first named connection
+    conn_seen = False
+    relations = []          # relations: list of (name, table, type)
+    md_records = []         # metadata records (columns)
+    objects = []            # object graph: objects and relationships
     relationships = []
-    for rel in root.findall(".//object-graph/relationships/relationship"):
-        eq = rel.find("./expression[@op='=']")
-        if eq is None: 
-            continue
-        parts = eq.findall("./expression")
-        if len(parts) != 2:
+
+    # Tag path from the root; the len() checks mirror './/a/b/c' (a must be below the root)
+    path: List[str] = []
+    push, pop = path.append, path.pop  # per-element calls: bind once
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            push(tag)
+            # Attribute-only records are taken on 'start' to keep document order
+            if tag == "relation":
+                if len(path) > 1 and elem.get("type") == "table":
+                    relations.append({
+                        "name": elem.get("name"),
+                        "table": elem.get("table"),
+                        "connection": elem.get("connection"),
+                        "type": elem.get("type"),
+                    })
+            elif tag == "object":
+                if len(path) > 3 and path[-3] == "object-graph" and path[-2] == "objects":
+                    objects.append({
+                        "caption": elem.get("caption"),
+                        "id": elem.get("id"),
+                    })
+            elif tag == "connection" and not conn_seen:
+                if len(path) > 3 and path[-3] == "named-connections" and path[-2] == "named-connection":
+                    conn_seen = True
+                    for k in ("server", "dbname", "class", "authentication"):
+                        v = elem.get(k)
+                        if v:
+                            conn_info[k] = v
             continue
-        left_op = parts[0].attrib.get("op", "")
-        right_op = parts[1].attrib.get("op", "")
-        left_ep = rel.find("./first-end-point")
-        right_ep = rel.find("./second-end-point")
-        relationships.append({
-            "left": left_op, "right": right_op,
-            "left_object_id": left_ep.attrib.get("object-id") if left_ep is not None else None,
-            "right_object_id": right_ep.attrib.get("object-id") if right_ep is not None else None
-        })
+
+        # 'end': the subtree is complete; path[-1] is now the parent
+        pop()
+        if tag == "metadata-record":
+            if len(path) > 1 and path[-1] == "metadata-records" and elem.get("class") == "column":
+                md_records.append(_metadata_record(elem))
+                _release(elem)
+        elif tag == "relationship":
+            if len(path) > 2 and path[-2] == "object-graph" and path[-1] == "relationships":
+                rec = _relationship_record(elem)
+                if rec is not None:
+                    relationships.append(rec)
+                _release(elem)
 
     return {
         "connection": conn_info,
@@ -116,33 +205,91 @@ def parse_tableau_xml(xml_path: str) -> Dict[str, Any]:
         "relationships": relationships,
     }
 
-def narrow_context_for_table(ctx: Dict[str, Any], table_name: str) -> Dict[str, Any]:
-    """Keep only info for the requested table + any relationships touching it."""
+# Bump when parse_tableau_xml's output shape changes: stale cache files are ignored
+_CTX_CACHE_VERSION = 2
+
+def _ctx_cache_path(xml_path: str) -> Path:
+    """Per-XML cache file in the user cache dir ($XDG_CACHE_HOME or ~/.cache), never next to the input."""
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    digest = hashlib.sha256(os.path.realpath(xml_path).encode("utf-8", "surrogateescape")).hexdigest()[:32]
+    return Path(root, "tableau_xml_to_bossstyle_ai", digest + ".json")
+
+@lru_cache(maxsize=4)
+def _parse_tableau_xml_cached(xml_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    # Warm re-runs (prompt iteration, other tables): reuse the parse stored as plain JSON
+    cache_path = _ctx_cache_path(xml_path)
+    key = [_CTX_CACHE_VERSION, mtime_ns, size]
+    try:
+        raw = cache_path.read_bytes()
+        cached = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        if cached["key"] == key:
+            return cached["ctx"]
+    except Exception:
+        pass  # missing, stale format or unreadable → parse
+    ctx = parse_tableau_xml(xml_path)
+    tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"key": key, "ctx": ctx}
+        tmp.write_bytes(orjson.dumps(payload) if orjson is not None
+                        else json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        os.replace(tmp, cache_path)
+    except OSError:
+        # read-only home etc.: the cache is only an optimization
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+    return ctx
+
+def load_tableau_context(xml_path: str) -> Dict[str, Any]:
+    """
+    parse_tableau_xml, memoized per (path, mtime, size): in memory within a process and
+    on disk (a JSON file under ~/.cache/tableau_xml_to_bossstyle_ai/) across runs, so
+    unchanged XML is parsed once. Callers must not mutate the result.
+    """
+    st = os.stat(xml_path)
+    return _parse_tableau_xml_cached(os.fspath(xml_path), st.st_mtime_ns, st.st_size)
+
+def index_metadata_by_parent(ctx: Dict[str, Any]) -> Dict[str, List[Dict[str, str]]]:
+    """parent-name → its metadata records (document order); one pass serves every table."""
+    index: Dict[str, List[Dict[str, str]]] = {}
+    setdefault = index.setdefault
+    for r in ctx.get("metadata_records", []):
+        setdefault(r.get("parent_name"), []).append(r)
+    return index
+
+def narrow_context_for_table(ctx: Dict[str, Any], table_name: str,
+                             md_index: Optional[Dict[str, List[Dict[str, str]]]] = None) -> Dict[str, Any]:
+    """
+    Keep only info for the requested table + any relationships touching it.
+    md_index (from index_metadata_by_parent) replaces the scan over all metadata records.
+    """
     parent_tag = f"[{table_name}]"
-    md = [r for r in ctx.get("metadata_records", []) if r.get("parent_name") == parent_tag]
+    if md_index is not None:
+        md = list(md_index.get(parent_tag, ()))
+    else:
+        md = [r for r in ctx.get("metadata_records", []) if r.get("parent_name") == parent_tag]
 
     # object id -> caption
     id2cap = {o["id"]: o["caption"] for o in ctx.get("objects", []) if o.get("id") and o.get("caption")}
+    # one pass: resolve endpoints and keep only rels involving this table
+    # (loop-invariant bound methods hoisted; r.get stays inline, 3.11+ specializes it)
     rels = []
+    add_rel = rels.append
+    cap_of = id2cap.get
     for r in ctx.get("relationships", []):
-        # resolve (table.col) = (table.col)
-        def _split_col(op: str) -> Tuple[Optional[str], Optional[str]]:
-            # op may be "[Region]" etc. We only have column name; table comes from endpoint object
-            col = op.strip("[]") if op else None
-            return (None, col)
-
-        lt, lc = _split_col(r.get("left"))
-        rt, rc = _split_col(r.get("right"))
-        left_tab = id2cap.get(r.get("left_object_id"))
-        right_tab = id2cap.get(r.get("right_object_id"))
-        rels.append({
-            "left_table": left_tab, "left_column": lc,
-            "right_table": right_tab, "right_column": rc
+        left_tab = cap_of(r.get("left_object_id"))
+        right_tab = cap_of(r.get("right_object_id"))
+        if left_tab != table_name and right_tab != table_name:
+            continue
+        # ops are "[Region]" etc.: only the column name; the table comes from the endpoint object
+        left, right = r.get("left"), r.get("right")
+        add_rel({
+            "left_table": left_tab, "left_column": left.strip("[]") if left else None,
+            "right_table": right_tab, "right_column": right.strip("[]") if right else None
         })
 
-    # filter only rels involving this table
-    rels = [x for x in rels if x["left_table"] == table_name or x["right_table"] == table_name]
-
     # keep a small connection dict
     conn = ctx.get("connection", {})
     return {
@@ -155,28 +302,43 @@ def narrow_context_for_table(ctx: Dict[str, Any], table_name: str) -> Dict[str,
 # -------------------------------
 # Required columns extraction
 # -------------------------------
-def extract_required_columns(narrowed_ctx: Dict[str, Any], table_name: str) -> List[str]:
-    cols = []
+def required_columns_set(narrowed_ctx: Dict[str, Any]) -> FrozenSet[str]:
+    """Column names the boss-style output must cover (membership only: no list, no sort)."""
+    names = ((rec.get("local_name") or "").strip("[]").strip()
+             for rec in (narrowed_ctx.get("metadata_records") or []))
+    return frozenset(n for n in names if n)
+
+def required_column_records(narrowed_ctx: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """Required column name → its metadata record (keys double as the quality loop's required set)."""
+    out: Dict[str, Dict[str, str]] = {}
     for rec in (narrowed_ctx.get("metadata_records") or []):
         name = (rec.get("local_name") or "").strip("[]").strip()
-        if name:
-            cols.append(name)
-    return sorted(set(cols), key=str.lower)
+        if name and name not in out:
+            out[name] = rec
+    return out
+
+def extract_required_columns(narrowed_ctx: Dict[str, Any], table_name: str) -> List[str]:
+    """Sorted for the prompt's {required_columns_list}."""
+    return sorted(required_columns_set(narrowed_ctx), key=str.lower)
+
+# boss-style "- name: X" entries (group n) and TMDL-like "column X" lines (group c), matched
+# in one pass over the whole text; [^\S\r\n] / [^\r\n] keep each match on a single line
+_BOSS_NAME_RE = re.compile(
+    r'^[^\S\r\n]*(?:-[^\S\r\n]*name[^\S\r\n]*:[^\S\r\n]*(?P<n>[^\r\n]+)'
+    r'|column[^\S\r\n]+(?P<c>[A-Za-z0-9_\-\[\]\. ]+))',
+    re.M,
+)
 
 def parse_boss_names(boss_text: str) -> set:
-    names = set()
-    for ln in (boss_text or "").splitlines():
-        m = re.match(r'^\s*-\s*name\s*:\s*(.+)$', ln)
-        if m:
-            names.add(m.group(1).strip().strip("'\""))
-        m2 = re.match(r'^\s*column\s+([A-Za-z0-9_\-\[\]\. ]+)', ln)
-        if m2:
-            names.add(m2.group(1).strip().strip("'\""))
-    return names
+    return {(m.group("n") or m.group("c")).strip().strip("'\"")
+            for m in _BOSS_NAME_RE.finditer(boss_text or "")}
 
 # -------------------------------
 # Prompt building
 # -------------------------------
+# "### COLUMNS_PROMPT" / "### PARTITION_PROMPT" on a line of its own (case-insensitive)
+_PROMPT_HEADER_RE = re.compile(r"^[^\S\n]*### (COLUMNS_PROMPT|PARTITION_PROMPT)[^\S\n]*$", re.I | re.M)
+
 def load_prompts(prompt_path: str) -> Dict[str, str]:
     """
     Reads a prompt file that may contain sections:
@@ -185,26 +347,15 @@ def load_prompts(prompt_path: str) -> Dict[str, str]:
     If sections not found, entire file is treated as COLUMNS_PROMPT.
     """
     text = Path(prompt_path).read_text(encoding="utf-8")
+    # One C-level split on the header lines: [preamble, name, body, name, body, ...]
+    pieces = _PROMPT_HEADER_RE.split("\n".join(text.splitlines()))
     parts = {}
-    cur = None
-    buf = []
-    for ln in text.splitlines():
-        hdr = ln.strip().upper()
-        if hdr == "### COLUMNS_PROMPT":
-            if cur:
-                parts[cur] = "\n".join(buf).strip()
-                buf = []
-            cur = "COLUMNS"
-            continue
-        if hdr == "### PARTITION_PROMPT":
-            if cur:
-                parts[cur] = "\n".join(buf).strip()
-                buf = []
-            cur = "PARTITION"
-            continue
-        buf.append(ln)
-    if cur:
-        parts[cur] = "\n".join(buf).strip()
+    if len(pieces) > 1:
+        # text before the first header is kept at the top of the first section
+        pre = pieces[0][:-1]  # drop the newline that ended the preamble
+        pieces[2] = pre + pieces[2]
+        for name, body in zip(pieces[1::2], pieces[2::2]):
+            parts[name.upper().split("_", 1)[0]] = body.strip()
     if "COLUMNS" not in parts:
         parts["COLUMNS"] = text.strip()
     return parts
@@ -219,7 +370,7 @@ def build_columns_prompt(table_name: str, narrowed_ctx: Dict[str, Any], template
     }
     out = template
     out = out.replace("{table_name}", table_name)
-    out = out.replace("{context_json}", json.dumps(payload, indent=2))
+    out = out.replace("{context_json}", _dumps(payload))
     out = out.replace("{required_columns_list}", "- " + "\n- ".join(req_cols))
     return out, req_cols
 
@@ -235,68 +386,419 @@ def build_partition_prompt(table_name: str, narrowed_ctx: Dict[str, Any], templa
     out = out.replace("{table_name}", table_name)
     out = out.replace("{server}", server)
     out = out.replace("{dbname}", dbname)
-    out = out.replace("{context_json}", json.dumps(payload, indent=2))
+    out = out.replace("{context_json}", _dumps(payload))
     return out
 
 # -------------------------------
 # LLM calls
 # -------------------------------
-def call_openai_chat(provider: str, model: str, system_prompt: str, user_prompt: str) -> str:
+# Transient failures (429, timeouts, connection errors, 5xx) are retried by the SDK itself:
+# exponential backoff with jitter, honouring Retry-After → no extra retry layer here.
+LLM_MAX_RETRIES = 3
+
+# Keep-alive pool size of the shared HTTP client (>= LLM_CONCURRENCY)
+HTTP_MAX_KEEPALIVE = 20
+
+def _http_client(async_: bool = False):
+    """
+    Explicit httpx client for the SDK: pooled keep-alive connections and HTTP/2 when `h2`
+    is installed (parallel requests multiplex over one TLS connection). None → SDK default.
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    from importlib.util import find_spec
+    opts = {
+        "http2": find_spec("h2") is not None,
+        "limits": httpx.Limits(max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        "timeout": httpx.Timeout(600.0, connect=10.0),
+    }
+    return httpx.AsyncClient(**opts) if async_ else httpx.Client(**opts)
+
+def _client_kwargs(provider: str, async_: bool = False) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"max_retries": LLM_MAX_RETRIES}
+    http_client = _http_client(async_)
+    if http_client is not None:
+        kwargs["http_client"] = http_client
     if provider == "azure":
-        from openai import AzureOpenAI
-        client = AzureOpenAI(
+        kwargs.update(
             api_key=os.environ["AZURE_OPENAI_API_KEY"],
             azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
             api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2024-12-01-preview"),
         )
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            # some Azure deployments only accept default temperature
-            max_completion_tokens=4096,
-        )
-        return (resp.choices[0].message.content or "").strip()
     else:
-        from openai import OpenAI
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            max_completion_tokens=2048,
-        )
-        return (resp.choices[0].message.content or "").strip()
+        kwargs["api_key"] = os.environ.get("OPENAI_API_KEY")
+    return kwargs
+
+@lru_cache(maxsize=None)
+def _sync_client(provider: str):
+    """One client per provider for the process: connections (TLS) are reused across calls."""
+    if provider == "azure":
+        from openai import AzureOpenAI
+        return AzureOpenAI(**_client_kwargs(provider))
+    from openai import OpenAI
+    return OpenAI(**_client_kwargs(provider))
+
+def call_openai_chat(provider: str, model: str, system_prompt: str, user_prompt: str) -> str:
+    resp = _sync_client(provider).chat.completions.create(
+        model=model,
+        # stable system message first, then the user prompt whose variable part (retry
+        # feedback) is appended at the end → the shared prefix is eligible for prompt caching
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        # some Azure deployments only accept default temperature
+        max_completion_tokens=4096 if provider == "azure" else 2048,
+    )
+    return (resp.choices[0].message.content or "").strip()
+
+SYSTEM_PROMPT_COLS = "You are a Power BI semantic model expert. Respond with boss-style YAML only."
+SYSTEM_PROMPT_PART = "You are a Power Query M and Power BI semantic model expert. Respond with the partition block only."
+
+# Retry prompt when the model omitted columns: only the missing columns' metadata is re-sent
+# (not the full context) and only their entries are asked for; they're appended to the output
+RETRY_PROMPT = (
+    'Table "{table_name}": your boss-style columns list omitted these required columns:\n'
+    "{missing_columns_list}\n\n"
+    "Output ONLY the entries for these columns, exactly once each, in the same format and "
+    "indentation as this existing entry (no other columns, no explanations):\n"
+    "{sample_entry}\n\n"
+    "CONTEXT (metadata of the missing columns, as JSON):\n"
+    "{context_json}"
+)
+
+def build_retry_prompt(table_name: str, boss_out: str, required: Dict[str, Dict[str, str]],
+                       miss: List[str]) -> str:
+    # first entry of the previous output, as the format reference
+    lines = boss_out.splitlines()
+    start = next((i for i, ln in enumerate(lines) if _BOSS_NAME_RE.match(ln)), None)
+    if start is None:
+        sample = "- name: <column>"
+    else:
+        end = next((i for i in range(start + 1, len(lines)) if _BOSS_NAME_RE.match(lines[i])), len(lines))
+        sample = "\n".join(lines[start:end]).rstrip()
+    payload = {
+        "table": table_name,
+        "metadata_records": [required[name] for name in miss if name in required],
+    }
+    out = RETRY_PROMPT
+    out = out.replace("{table_name}", table_name)
+    out = out.replace("{missing_columns_list}", "- " + "\n- ".join(miss))
+    out = out.replace("{sample_entry}", sample)
+    out = out.replace("{context_json}", _dumps(payload))
+    return out
+
+def _indent_width(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+def merge_retry_output(boss_out: str, extra: str, miss: List[str]) -> str:
+    """
+    Append the retry's entries for the columns in miss, each at most once. Everything else in
+    the reply (entries for other or already-present columns, ``` fences, prose) is dropped.
+    An entry is its name line plus the following lines indented deeper than it.
+    """
+    wanted = set(miss)
+    lines = extra.splitlines()
+    kept = []
+    i = 0
+    while i < len(lines):
+        m = _BOSS_NAME_RE.match(lines[i])
+        if not m:
+            i += 1
+            continue
+        depth = _indent_width(lines[i])
+        end = i + 1
+        while end < len(lines):
+            ln = lines[end]
+            if ln.strip():
+                if _indent_width(ln) <= depth:
+                    break
+            else:
+                nxt = lines[end + 1] if end + 1 < len(lines) else ""
+                if not nxt.strip() or _indent_width(nxt) <= depth:
+                    break  # blank line that doesn't continue the entry
+            end += 1
+        name = (m.group("n") or m.group("c")).strip().strip("'\"")
+        if name in wanted:
+            wanted.discard(name)
+            kept.append("\n".join(lines[i:end]).rstrip())
+        i = end
+    if not kept:
+        return boss_out
+    base = boss_out.rstrip("\n")
+    return (base + "\n" if base else "") + "\n".join(kept)
+
+def make_async_client(provider: str):
+    """
+    One async client per run (bound to its event loop), shared by the concurrent
+    columns / partition calls.
+    """
+    if provider == "azure":
+        from openai import AsyncAzureOpenAI
+        return AsyncAzureOpenAI(**_client_kwargs(provider, async_=True))
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(**_client_kwargs(provider, async_=True))
+
+async def call_openai_chat_async(client, provider: str, model: str, system_prompt: str, user_prompt: str) -> str:
+    """Async twin of call_openai_chat (same messages and token limits)."""
+    resp = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        # some Azure deployments only accept default temperature
+        max_completion_tokens=4096 if provider == "azure" else 2048,
+    )
+    return (resp.choices[0].message.content or "").strip()
+
+# Tableau local-type → dataType, as the columns prompt instructs the model
+_BOSS_DTYPES = {
+    "integer": "int64", "real": "double", "string": "string",
+    "date": "dateTime", "datetime": "dateTime", "boolean": "boolean",
+}
+
+# Up to this many omitted columns are filled in locally instead of another LLM round-trip
+LOCAL_FILL_MAX_MISSING = 5
+
+def synthesize_missing_columns(boss_out: str, required: Dict[str, Dict[str, str]], miss: List[str]) -> str:
+    """
+    Append deterministic entries for the columns the model omitted, built from their metadata
+    records with the prompt's rules (dataType map; summarizeBy count for Row_ID, sum for numbers,
+    none otherwise; sourceColumn = name). Follows the output's style and indentation:
+    '- name:' list items, or TMDL-like 'column' blocks.
+    """
+    tmdl, indent, field = False, "", "  "
+    lines = boss_out.splitlines()
+    for i, ln in enumerate(lines):
+        m = _BOSS_NAME_RE.match(ln)
+        if m:
+            tmdl = m.group("c") is not None
+            indent = ln[:len(ln) - len(ln.lstrip())]
+            nxt = lines[i + 1] if i + 1 < len(lines) else ""
+            nxt_indent = nxt[:len(nxt) - len(nxt.lstrip())]
+            field = nxt_indent if nxt.strip() and len(nxt_indent) > len(indent) else indent + "  "
+            break
+    blocks = []
+    for name in miss:
+        rec = required.get(name) or {}
+        dtype = _BOSS_DTYPES.get((rec.get("local_type") or "").lower(), "string")
+        summarize = "count" if name == "Row_ID" else ("sum" if dtype in ("int64", "double") else "none")
+        head = f"{indent}column {name}" if tmdl else f"{indent}- name: {name}"
+        blocks.append(f"{head}\n{field}dataType: {dtype}\n{field}summarizeBy: {summarize}\n{field}sourceColumn: {name}")
+    base = boss_out.rstrip("\n")
+    return (base + "\n" if base else "") + "\n".join(blocks)
+
+def fill_missing_columns(table: str, boss_out: str, required: Dict[str, Dict[str, str]],
+                         miss: List[str]) -> str:
+    """
+    Final step of the quality loop: up to LOCAL_FILL_MAX_MISSING omitted columns are synthesized
+    locally; a larger gap is left as-is. Either way the columns are named on stderr.
+    """
+    if not miss:
+        return boss_out
+    if len(miss) > LOCAL_FILL_MAX_MISSING:
+        print(f"[WARN] {table}: {len(miss)} columns still missing after retries, not filled in: "
+              f"{', '.join(miss)}", file=sys.stderr)
+        return boss_out
+    print(f"[WARN] {table}: columns filled in locally (not returned by the model): {', '.join(miss)}",
+          file=sys.stderr)
+    return synthesize_missing_columns(boss_out, required, miss)
+
+# Max LLM requests in flight at once (multi-table runs)
+LLM_CONCURRENCY = 10
+
+async def generate_outputs(client, sem: asyncio.Semaphore, provider: str, model: str,
+                           table: str, user_prompt_cols: str, required: Dict[str, Dict[str, str]],
+                           user_prompt_part: str) -> Tuple[str, str]:
+    """
+    Run the columns call (with its quality loop) and the partition call concurrently:
+    they share no data, so total latency is the slower of the two instead of the sum.
+    """
+    async def ask(system_prompt: str, user_prompt: str) -> str:
+        async with sem:
+            return await call_openai_chat_async(client, provider, model, system_prompt, user_prompt)
+
+    async def boss_columns() -> str:
+        boss_out = await ask(SYSTEM_PROMPT_COLS, user_prompt_cols)
+
+        # Quality loop: ensure all columns present. A few omissions are filled in locally
+        # (no extra round-trip); larger gaps are retried up to 2 times first.
+        # Retries ask only for the missing entries (same system prompt → cached prefix).
+        miss = sorted(required.keys() - parse_boss_names(boss_out))
+        retries = 0
+        while len(miss) > LOCAL_FILL_MAX_MISSING and retries < 2:
+            feedback = build_retry_prompt(table, boss_out, required, miss)
+            boss_out = merge_retry_output(boss_out, await ask(SYSTEM_PROMPT_COLS, feedback), miss)
+            miss = sorted(required.keys() - parse_boss_names(boss_out))
+            retries += 1
+        return fill_missing_columns(table, boss_out, required, miss)
+
+    boss_out, part_out = await asyncio.gather(boss_columns(), ask(SYSTEM_PROMPT_PART, user_prompt_part))
+    return boss_out, part_out
+
+async def generate_tables(provider: str, model: str, out_dir: Path,
+                          jobs: List[Tuple[str, str, Dict[str, Dict[str, str]], str]]) -> None:
+    """
+    All tables' LLM work on one client, concurrently (bounded by LLM_CONCURRENCY).
+    Each table's files are written as soon as that table is done.
+    """
+    client = make_async_client(provider)
+    sem = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def process_table(table: str, user_prompt_cols: str, required: Dict[str, Dict[str, str]],
+                            user_prompt_part: str) -> None:
+        boss_out, part_out = await generate_outputs(client, sem, provider, model,
+                                                    table, user_prompt_cols, required, user_prompt_part)
+        (out_dir / f"{table}_columns_boss_style.txt").write_text(boss_out + "\n", encoding="utf-8")
+        (out_dir / f"{table}_partition.m").write_text(part_out + "\n", encoding="utf-8")
+
+    try:
+        await asyncio.gather(*(process_table(*job) for job in jobs))
+    finally:
+        await client.close()
+
+# Batch API (--batch): ~50% cheaper, higher throughput, completes within 24h
+BATCH_POLL_SECONDS = 30
+_BATCH_DONE = ("completed", "failed", "expired", "cancelled")
+
+def call_openai_batch(provider: str, model: str, requests: Dict[str, Tuple[str, str]],
+                      state_dir: Path) -> Dict[str, str]:
+    """
+    Submit {custom_id: (system_prompt, user_prompt)} as one Batch API job, wait for it,
+    and return {custom_id: content}. Requests that failed inside the batch map to "".
+    Blocks until the batch ends (polling every BATCH_POLL_SECONDS, up to the 24h window).
+    The batch id is kept in state_dir/batch_<hash of the requests>.json until the results
+    are in, so an interrupted run that is started again with the same input resumes
+    waiting on that batch instead of submitting (and paying for) a new one.
+    """
+    client = _sync_client(provider)
+    # Azure's batch docs use the deployment-relative path; OpenAI's the /v1 one
+    url = "/chat/completions" if provider == "azure" else "/v1/chat/completions"
+    max_tokens = 4096 if provider == "azure" else 2048
+    lines = [
+        json.dumps({
+            "custom_id": cid, "method": "POST", "url": url,
+            "body": {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                "max_completion_tokens": max_tokens,
+            },
+        })
+        for cid, (system_prompt, user_prompt) in requests.items()
+    ]
+    payload = "\n".join(lines).encode("utf-8")
+    state_file = Path(state_dir) / f"batch_{hashlib.sha256(payload).hexdigest()[:16]}.json"
+
+    batch = None
+    try:
+        batch_id = json.loads(state_file.read_text(encoding="utf-8"))["batch_id"]
+    except (OSError, ValueError, KeyError):
+        batch_id = None  # no earlier run (or an unreadable state file)
+    if batch_id:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in _BATCH_DONE and batch.status != "completed":
+            batch = None  # the earlier attempt died → submit again
+        else:
+            print(f"Resuming batch {batch.id} ({batch.status})")
+    if batch is None:
+        batch_input = client.files.create(file=("batch.jsonl", payload), purpose="batch")
+        batch = client.batches.create(input_file_id=batch_input.id, endpoint=url, completion_window="24h")
+        state_file.write_text(json.dumps({"batch_id": batch.id}) + "\n", encoding="utf-8")
+        print(f"Submitted batch {batch.id} ({len(requests)} requests); id saved in {state_file}")
+    while batch.status not in _BATCH_DONE:
+        time.sleep(BATCH_POLL_SECONDS)
+        batch = client.batches.retrieve(batch.id)
+    if batch.status != "completed" or not batch.output_file_id:
+        state_file.unlink(missing_ok=True)
+        raise SystemExit(f"[ERROR] Batch {batch.id} ended with status '{batch.status}'")
+
+    results = {cid: "" for cid in requests}
+    for ln in client.files.content(batch.output_file_id).text.splitlines():
+        if not ln.strip():
+            continue
+        rec = json.loads(ln)
+        choices = (((rec.get("response") or {}).get("body") or {}).get("choices")) or []
+        if choices:
+            results[rec["custom_id"]] = ((choices[0].get("message") or {}).get("content") or "").strip()
+    state_file.unlink(missing_ok=True)
+    failed = [cid for cid, out in results.items() if not out]
+    if failed:
+        print(f"[WARN] Batch {batch.id}: no output for {', '.join(failed)}", file=sys.stderr)
+    return results
+
+def generate_tables_batch(provider: str, model: str, out_dir: Path,
+                          jobs: List[Tuple[str, str, Dict[str, Dict[str, str]], str]]) -> None:
+    """
+    generate_tables via the Batch API; the quality loop retries all incomplete tables in one batch
+    per round. Tables whose columns or partition request got no output from the batch are not
+    written; they are reported with a non-zero exit once the other tables' files are written.
+    """
+    requests = {}
+    for i, (table, user_prompt_cols, _, user_prompt_part) in enumerate(jobs):
+        requests[f"{i}:cols"] = (SYSTEM_PROMPT_COLS, user_prompt_cols)
+        requests[f"{i}:part"] = (SYSTEM_PROMPT_PART, user_prompt_part)
+    results = call_openai_batch(provider, model, requests, out_dir)
+    boss = [results[f"{i}:cols"] for i in range(len(jobs))]
+    failed = {i for i in range(len(jobs)) if not boss[i] or not results[f"{i}:part"]}
+
+    # Quality loop: tables missing more than LOCAL_FILL_MAX_MISSING columns are retried
+    # (up to 2 rounds); then fill_missing_columns handles what is still missing
+    for _ in range(2):
+        retry, misses = {}, {}
+        for i, (table, _, required, _) in enumerate(jobs):
+            if i in failed:
+                continue
+            miss = sorted(required.keys() - parse_boss_names(boss[i]))
+            if len(miss) > LOCAL_FILL_MAX_MISSING:
+                retry[f"{i}:cols"] = (SYSTEM_PROMPT_COLS, build_retry_prompt(table, boss[i], required, miss))
+                misses[i] = miss
+        if not retry:
+            break
+        for cid, out in call_openai_batch(provider, model, retry, out_dir).items():
+            i = int(cid.split(":", 1)[0])
+            boss[i] = merge_retry_output(boss[i], out, misses[i])
+    for i, (table, _, required, _) in enumerate(jobs):
+        if i in failed:
+            continue
+        miss = sorted(required.keys() - parse_boss_names(boss[i]))
+        boss[i] = fill_missing_columns(table, boss[i], required, miss)
+
+    for i, (table, *_) in enumerate(jobs):
+        if i in failed:
+            continue
+        (out_dir / f"{table}_columns_boss_style.txt").write_text(boss[i] + "\n", encoding="utf-8")
+        (out_dir / f"{table}_partition.m").write_text(results[f"{i}:part"] + "\n", encoding="utf-8")
+    if failed:
+        # an empty partition / columns file would otherwise be integrated as if it were valid
+        names = ", ".join(jobs[i][0] for i in sorted(failed))
+        raise SystemExit(f"[ERROR] Batch returned no output for table(s) {names}; their files were not written")
 
 # -------------------------------
 # Main
 # -------------------------------
-def main():
-    ap = argparse.ArgumentParser(description="Generate boss-style columns and M partition via LLM from Tableau XML.")
-    ap.add_argument("--input", required=True, help="Path to Tableau datasource XML")
-    ap.add_argument("--out-dir", required=True, help="Output directory")
-    ap.add_argument("--table", required=True, help="Target table name, e.g., Orders")
-    ap.add_argument("--provider", choices=["openai", "azure"], required=True, help="LLM provider")
-    ap.add_argument("--model", required=True, help="Model or deployment name")
-    ap.add_argument("--prompt-file", required=True, help="Path to prompt file (supports sections)")
-    args = ap.parse_args()
-
-    out_dir = Path(args.out_dir)
+def process(xml_path: str, tables: List[str], provider: str, model: str, prompt_file: str,
+            out_dir: str, batch: bool = False) -> List[Path]:
+    """
+    Generate the boss-style columns + M partition for each table; returns the written files.
+    Reentrant: the parsed XML and the sync client are cached, so a long-running caller
+    (--serve) only pays for parsing / SDK imports once.
+    """
+    out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # 1) Parse XML and narrow context
-    ctx = parse_tableau_xml(args.input)
-    narrowed = narrow_context_for_table(ctx, args.table)
+    tables = list(dict.fromkeys(tables))  # de-dup, keep order
 
-    # Save context for debugging
-    Path(out_dir / "context.json").write_text(json.dumps(narrowed, indent=2), encoding="utf-8")
+    # 1) Parse XML once for all tables
+    ctx = load_tableau_context(xml_path)
 
     # 2) Load prompts
-    parts = load_prompts(args.prompt_file)
+    parts = load_prompts(prompt_file)
     columns_template = parts.get("COLUMNS", "")
     partition_template = parts.get("PARTITION", "").strip()
     if not partition_template:
@@ -321,40 +823,92 @@ def main():
             "Return ONLY the partition block, no prose."
         )
 
-    # 3) Build & call LLM for columns
-    system_prompt_cols = "You are a Power BI semantic model expert. Respond with boss-style YAML only."
-    user_prompt_cols, required_cols = build_columns_prompt(args.table, narrowed, columns_template)
-    boss_out = call_openai_chat(args.provider, args.model, system_prompt_cols, user_prompt_cols)
-
-    # Quality loop: ensure all columns present; retry up to 2 times if missing
-    got = parse_boss_names(boss_out)
-    miss = sorted(set(required_cols) - got)
-    retries = 0
-    while miss and retries < 2:
-        feedback = (
-            user_prompt_cols +
-            "\n\nIMPORTANT: You omitted the following required columns. "
-            "Regenerate the full boss-style list covering ALL columns exactly once, "
-            "no extras, no omissions:\n- " + "\n- ".join(miss)
-        )
-        boss_out = call_openai_chat(args.provider, args.model, system_prompt_cols, feedback)
-        got = parse_boss_names(boss_out)
-        miss = sorted(set(required_cols) - got)
-        retries += 1
-
-    # 4) Build & call LLM for partition
-    system_prompt_part = "You are a Power Query M and Power BI semantic model expert. Respond with the partition block only."
-    user_prompt_part = build_partition_prompt(args.table, narrowed, partition_template)
-    part_out = call_openai_chat(args.provider, args.model, system_prompt_part, user_prompt_part)
+    # 3) Narrow context + build prompts per table
+    md_index = index_metadata_by_parent(ctx)
+    jobs = []
+    ctx_files = []
+    for table in tables:
+        narrowed = narrow_context_for_table(ctx, table, md_index)
+
+        # Save context for debugging (one file per table when several are generated)
+        ctx_file = out_dir / ("context.json" if len(tables) == 1 else f"{table}_context.json")
+        _dump_to(ctx_file, narrowed)
+        ctx_files.append(ctx_file)
+
+        user_prompt_cols, required_cols = build_columns_prompt(table, narrowed, columns_template)
+        user_prompt_part = build_partition_prompt(table, narrowed, partition_template)
+        # the sorted list only feeds the prompt; the quality loop needs membership + metadata
+        jobs.append((table, user_prompt_cols, required_column_records(narrowed), user_prompt_part))
+
+    # 4) Call the LLM for every table (columns + partition) concurrently; 5) files are written per table
+    if batch:
+        generate_tables_batch(provider, model, out_dir, jobs)
+    else:
+        asyncio.run(generate_tables(provider, model, out_dir, jobs))
 
-    # 5) Write files
-    (out_dir / f"{args.table}_columns_boss_style.txt").write_text(boss_out + "\n", encoding="utf-8")
-    (out_dir / f"{args.table}_partition.m").write_text(part_out + "\n", encoding="utf-8")
+    outputs = []
+    for table in tables:
+        outputs.append(out_dir / f"{table}_columns_boss_style.txt")
+        outputs.append(out_dir / f"{table}_partition.m")
+    return outputs + ctx_files
 
+def serve(defaults: argparse.Namespace) -> None:
+    """
+    --serve: one JSON request per stdin line, one JSON reply per stdout line, e.g.
+      {"input": "ds.xml", "table": ["Orders"], "out_dir": "out"}
+    provider / model / prompt_file / batch default to the command-line values.
+    Progress messages go to stderr so stdout carries only replies.
+    """
+    from contextlib import redirect_stdout
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            req = json.loads(line)
+            table = req["table"]
+            with redirect_stdout(sys.stderr):
+                outputs = process(
+                    req["input"], [table] if isinstance(table, str) else table,
+                    req.get("provider", defaults.provider), req.get("model", defaults.model),
+                    req.get("prompt_file", defaults.prompt_file), req["out_dir"],
+                    bool(req.get("batch", defaults.batch)),
+                )
+            reply = {"ok": True, "outputs": [str(p) for p in outputs]}
+        except (Exception, SystemExit) as e:
+            # SystemExit too: process() and the batch path abort with it; one request must not end the server
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        sys.stdout.write(json.dumps(reply) + "\n")
+        sys.stdout.flush()
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Generate boss-style columns and M partition via LLM from Tableau XML.")
+    ap.add_argument("--input", help="Path to Tableau datasource XML")
+    ap.add_argument("--out-dir", help="Output directory")
+    ap.add_argument("--table", action="append",
+                    help="Target table name, e.g., Orders (repeat for several tables in one run)")
+    ap.add_argument("--provider", choices=["openai", "azure"], required=True, help="LLM provider")
+    ap.add_argument("--model", required=True, help="Model or deployment name")
+    ap.add_argument("--prompt-file", required=True, help="Path to prompt file (supports sections)")
+    ap.add_argument("--batch", action="store_true",
+                    help="Use the Batch API (cheaper, non-interactive). Blocks until the batch is done, "
+                         "which can take up to 24h; the batch id is saved in OUT_DIR, so re-running the "
+                         "same command after an interruption resumes it. Azure needs a Global Batch "
+                         "deployment (requests use the /chat/completions url)")
+    ap.add_argument("--serve", action="store_true",
+                    help="Keep running: read JSON requests from stdin, one per line (see serve())")
+    args = ap.parse_args(argv)
+
+    if args.serve:
+        serve(args)
+        return
+    if not (args.input and args.out_dir and args.table):
+        ap.error("--input, --out-dir and --table are required (unless --serve)")
+
+    outputs = process(args.input, args.table, args.provider, args.model,
+                      args.prompt_file, args.out_dir, args.batch)
     print("Done.")
-    print(" -", out_dir / f"{args.table}_columns_boss_style.txt")
-    print(" -", out_dir / f"{args.table}_partition.m")
-    print(" -", out_dir / "context.json")
+    for path in outputs:
+        print(" -", path)
 
 if __name__ == "__main__":
     main()
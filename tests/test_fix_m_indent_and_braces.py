@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# Engine parity for fix_m_indent_and_braces.py: the partition pattern must give the same
+# result under stdlib re and the optional google-re2.
+# Run from the repo root:  python -m unittest discover -s tests
+
+import re
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fix_m_indent_and_braces as fix_m  # noqa: E402
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+# The pattern as it was written with stdlib \s (reference behaviour)
+BASELINE_PATTERN = (
+    r"(?:^|\n)([ \t]*)source\s*=\s*\n"
+    r"([ \t]*)let\s*\n"
+    r"(?P<body>[\s\S]*?)"
+    r"\n[ \t]*in\s*\n"
+    r"[ \t]*(?P<ret>[^\n]+)"
+)
+
+def _partition(sep: str) -> str:
+    return (
+        "table T\n"
+        "  partition T = m\n"
+        "    mode: import\n"
+        f"    source ={sep}\n"
+        f"  let{sep}\n"
+        "      Source = Sql.Databases(\"srv\"),\n"
+        "  db = Source{[Name=\"x\"]}[Data]\n"
+        f"  in{sep}\n"
+        "         db\n"
+    )
+
+CASES = {
+    "plain": _partition(""),
+    "trailing spaces": _partition("  \t"),
+    "nbsp": _partition(" "),
+    "ideographic space": _partition("　"),
+    "line separator": _partition(" "),
+    "file separator": _partition("\x1c"),
+    "no partition": "table T\n  column a\n",
+}
+
+def _run(compiled, text: str) -> str:
+    with mock.patch.object(fix_m, "_PARTITION_RE", compiled):
+        return fix_m.fix_m_partition_block(text)
+
+class PartitionPatternTest(unittest.TestCase):
+
+    def test_whitespace_class_matches_stdlib_s(self):
+        ws = re.compile(fix_m._WS)
+        for cp in range(0x110000):
+            c = chr(cp)
+            self.assertEqual(bool(ws.fullmatch(c)), bool(re.fullmatch(r"\s", c)), hex(cp))
+
+    def test_stdlib_engine_matches_baseline(self):
+        baseline = re.compile(BASELINE_PATTERN, re.MULTILINE)
+        current = re.compile(fix_m._PARTITION_PATTERN)
+        for name, text in CASES.items():
+            with self.subTest(name):
+                self.assertEqual(_run(current, text), _run(baseline, text))
+
+    @unittest.skipIf(re2 is None, "google-re2 not installed")
+    def test_re2_engine_matches_stdlib(self):
+        std = re.compile(fix_m._PARTITION_PATTERN)
+        fast = re2.compile(fix_m._PARTITION_PATTERN)
+        for name, text in CASES.items():
+            with self.subTest(name):
+                self.assertEqual(_run(fast, text), _run(std, text))
+
+    def test_nbsp_after_source_is_normalized(self):
+        out = fix_m.fix_m_partition_block(CASES["nbsp"])
+        self.assertIn("\n  source =\n      let\n        Source = Sql.Databases(\"srv\"),\n", out)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# tmdl_io.py
+# Small file I/O helpers shared by the TMDL pipeline scripts
+# (pbip_integrate.py, normalize_tmdl_style.py, fix_m_indent_and_braces.py).
+
+import os
+import stat
+from pathlib import Path
+
+def read_text(path: Path) -> str:
+    # One open + fstat + read instead of read_text's chunked reads
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        os.close(fd)
+    text = data.decode("utf-8")
+    # Keep read_text's universal-newline behaviour
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def _write_fd(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def write_bytes(path: Path, data: bytes) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        _write_fd(fd, data)
+    finally:
+        os.close(fd)
+
+def write_text(path: Path, text: str) -> None:
+    write_bytes(path, text.encode("utf-8"))
+
+def _copy_owner(fd: int, st: os.stat_result) -> bool:
+    """Give fd the uid/gid in st; False when that isn't permitted."""
+    if not hasattr(os, "fchown"):
+        return True
+    cur = os.fstat(fd)
+    if (cur.st_uid, cur.st_gid) == (st.st_uid, st.st_gid):
+        return True
+    try:
+        os.fchown(fd, st.st_uid, st.st_gid)
+    except PermissionError:
+        return False
+    return True
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """
+    Write to a sibling temp file, then swap it in. The temp file gets the original's
+    mode and owner first, so the result matches an in-place write_text. Falls back to
+    writing in place when the swap can't keep that (other hardlinks, owner not settable).
+    """
+    path = Path(os.path.realpath(path))  # write through symlinks, like write_text
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        st = None
+    if st is not None and st.st_nlink > 1:
+        write_bytes(path, data)  # os.replace would detach this name from the others
+        return
+
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    swap = True
+    try:
+        if st is not None:
+            # owner can't be reproduced (not root) → keep the original inode instead
+            swap = _copy_owner(fd, st)
+            if swap and hasattr(os, "fchmod"):
+                os.fchmod(fd, stat.S_IMODE(st.st_mode))
+        if swap:
+            _write_fd(fd, data)
+    except BaseException:
+        swap = False
+        raise
+    finally:
+        os.close(fd)
+        if not swap:
+            os.unlink(tmp)
+    if not swap:
+        write_bytes(path, data)
+        return
+    if st is not None and not hasattr(os, "fchmod"):
+        os.chmod(tmp, stat.S_IMODE(st.st_mode))
+    os.replace(tmp, path)